@@ -0,0 +1,115 @@
+import numpy as np
+import solver
+import unionfind
+
+# Quality metrics for generated mazes, computed in bulk from the edge states
+# so that they're cheap enough to filter every maze of a batch with.
+
+# Number of open directions in every 4 bit mask of solver.open_directions.
+_DEGREE = np.array([bin(i).count('1') for i in xrange(0, 16)], dtype=np.uint8)
+
+
+# Returns the cell pairs (a, b) of every passage between two cells, as flat
+# cell numbers (see solver), from open_directions.
+def passages(open_dirs):
+  height, width = open_dirs.shape
+  cells = np.arange(height * width, dtype=np.int32).reshape(height, width)
+  east = (open_dirs & solver.EAST) != 0
+  north = (open_dirs & solver.NORTH) != 0
+  a = np.concatenate((cells[east], cells[north]))
+  b = np.concatenate((cells[east] + 1, cells[north] + width))
+  return a, b
+
+
+# Returns a dict of metrics of the maze:
+#
+#   cells              Number of cells.
+#   passages           Number of open edges between two cells.
+#   components         Number of connected groups of cells.
+#   loops              Number of passages that could be walled up without
+#                      disconnecting anything (0 for a loop-free maze).
+#   unreachable_cells  Cells that can't be reached from start (the first
+#                      exit by default, or the largest component if there
+#                      are no exits).
+#   connected, loop_free, perfect
+#                      Whether there's one component, no loops, and both.
+#   dead_ends          Cells with one way out.
+#   junctions          Cells with three or four ways out.
+#   branching_factor   Average number of ways on from the cells that aren't
+#                      dead ends, i.e. open directions minus the one you
+#                      came in by.
+#   corridor_lengths   Histogram of corridor lengths, where a corridor is a
+#                      longest chain of cells with exactly two ways out.
+#   solution_length    Number of moves from start to end (the first two
+#                      exits by default), or None if there's no path or not
+#                      enough exits.
+#   wall_sizes         Number of edges of every wall id.
+def analyze(maze, start=None, end=None):
+  open_dirs = solver.open_directions(maze)
+  num_cells = open_dirs.size
+  a, b = passages(open_dirs)
+  degree = _DEGREE[open_dirs.ravel()]
+
+  labels = unionfind.label_components(num_cells, a, b)
+  component_sizes = np.bincount(labels, minlength=num_cells)
+  components = np.count_nonzero(component_sizes)
+  # A forest of c trees over n cells has exactly n - c passages.
+  loops = len(a) - (num_cells - components)
+
+  if start is None and maze.exits:
+    start = maze.exits[0]
+  if start is not None:
+    x, y = solver.as_cell(maze, start)
+    reachable = component_sizes[labels[y * maze.width + x]]
+  else:
+    reachable = component_sizes.max() if num_cells else 0
+
+  # Corridors are the components of the passages between two corridor cells.
+  corridor = degree == 2
+  inside = corridor[a] & corridor[b]
+  corridor_labels = unionfind.label_components(
+      num_cells, a[inside], b[inside])
+  corridor_sizes = np.bincount(corridor_labels[corridor])
+  corridor_lengths = np.bincount(corridor_sizes[corridor_sizes > 0])
+
+  branching = degree[degree >= 2]
+  solution_length = None
+  if (start is not None and end is not None) or len(maze.exits) >= 2:
+    path = solver.solve(maze, start, end)
+    if path is not None:
+      solution_length = len(path) - 1
+
+  walls = maze.edges[maze.edges >= 0]
+  return {
+      'cells': num_cells,
+      'passages': len(a),
+      'components': components,
+      'loops': loops,
+      'unreachable_cells': num_cells - int(reachable),
+      'connected': components == 1,
+      'loop_free': loops == 0,
+      'perfect': components == 1 and loops == 0,
+      'dead_ends': int(np.count_nonzero(degree == 1)),
+      'junctions': int(np.count_nonzero(degree >= 3)),
+      'branching_factor': (
+          float(branching.mean()) - 1 if len(branching) else 0.),
+      'corridor_lengths': corridor_lengths.tolist(),
+      'solution_length': solution_length,
+      'wall_sizes': np.bincount(walls).tolist() if len(walls) else [],
+  }
+
+
+# Returns the names of the limits in accept that the metrics fail. accept maps
+# 'min_<metric>' or 'max_<metric>' to a bound on a numeric metric, or a
+# boolean metric such as 'perfect' to the value it must have.
+def rejections(metrics, accept):
+  failed = []
+  for name, bound in sorted(accept.items()):
+    if name.startswith('min_') or name.startswith('max_'):
+      value = metrics[name[4:]]
+      if value is None or (
+          value < bound if name.startswith('min_') else value > bound):
+        failed.append(name)
+    elif metrics[name] != bound:
+      failed.append(name)
+  return failed
@@ -0,0 +1,240 @@
+import numpy as np
+from PIL import GifImagePlugin
+from PIL import Image
+from maze import Edge
+from maze import Maze
+from canvas import Canvas
+from canvas import IndexCanvas
+
+
+# Keeps an image of a maze up to date as its edges change, repainting only
+# the changed edges. The image holds palette slots as returned by
+# IndexCanvas.get_palette_indices (0 for the background, 1 for black and
+# 2 + wall % len(color_list) for walls), or just background and black if
+# there's no color_list, and matches what create_index_canvas would draw.
+class FrameRenderer(object):
+
+  def __init__(self, maze, pixels_per_square, line_width=1, color_list=None):
+    if line_width > int(pixels_per_square):
+      raise ValueError('Lines can be at most one square wide')
+    self.maze = maze
+    self.pixels_per_square = pixels_per_square
+    self.line_width = line_width
+    self.color_list = color_list
+    self.num_colors = (
+        min(len(color_list), IndexCanvas.MAX_COLORS) if color_list else 0)
+    # Grid lines are placed with the same rounding as in Maze.draw, so the
+    # last ones end exactly at the edge of the image.
+    self.width = int(np.rint(maze.width * pixels_per_square)) + line_width
+    self.height = int(np.rint(maze.height * pixels_per_square)) + line_width
+    # Pixel offsets of every grid line, indexed by x and y, as in Maze.draw.
+    self.cols = np.rint(
+        np.arange(0, maze.width + 1) * pixels_per_square).astype(int).tolist()
+    self.rows = np.rint(
+        np.arange(maze.height, -1, -1) * pixels_per_square).astype(
+            int).tolist()
+    self.slots = np.zeros((self.height, self.width), dtype=np.uint8)
+    # (x0, y0, x1, y1) boxes of the pixels painted since take_dirty().
+    self.dirty = []
+
+  # Returns the palette of the image, background first.
+  def palette(self, background=Canvas.COLORS['WHITE']):
+    colors = [background, Canvas.COLORS['BLACK']]
+    if self.color_list:
+      colors += self.color_list[:self.num_colors]
+    return colors
+
+  # Repaints the whole maze.
+  def reset(self):
+    canvas = IndexCanvas(width=self.width, height=self.height)
+    self.maze.draw(
+        canvas, (0, 0), self.pixels_per_square, self.line_width,
+        None if self.num_colors else IndexCanvas.BLACK)
+    self.slots = canvas.get_palette_indices(max(1, self.num_colors))
+    self.dirty = [(0, 0, self.width, self.height)]
+
+  def _slot(self, value):
+    if value >= 0:
+      return 2 + value % self.num_colors if self.num_colors else 1
+    return 1 if value == Maze.PAINTED else 0
+
+  # Repaints the line_width square where the lines meet at a grid point. Of
+  # the edges meeting there, VERT wins over HORZ, the upper VERT edge wins
+  # over the lower one and the right HORZ edge wins over the left one, the
+  # same as in Maze.draw.
+  def _paint_joint(self, x, y):
+    edges = self.maze.edges
+    point_edges = self.maze.grid.point_edges.item
+    p = y * (self.maze.width + 1) + x
+    value = Maze.EMPTY
+    # North, south, east then west, in point_edges order.
+    for i in xrange(4 * p + 3, 4 * p - 1, -1):
+      e = point_edges(i)
+      if e < 0:
+        continue
+      v = edges.item(e)
+      if v >= 0 or v == Maze.PAINTED:
+        value = v
+        break
+    row = self.rows[y]
+    col = self.cols[x]
+    self.slots[row:row + self.line_width, col:col + self.line_width] = (
+        self._slot(value))
+
+  # Repaints the given edges (ids as yielded by generate_each_wall with
+  # report_changes) and their end points.
+  def update(self, changed):
+    maze = self.maze
+    line_width = self.line_width
+    vert_offset = maze.edge_offset[Edge.VERT]
+    for e in changed:
+      edge = maze._edge_from_index(e)
+      x, y = edge.x, edge.y
+      slot = self._slot(maze.edges.item(e))
+      if e < vert_offset:
+        row = self.rows[y]
+        col0 = self.cols[x]
+        col1 = self.cols[x + 1]
+        self.slots[row:row + line_width, col0 + line_width:col1] = slot
+        self._paint_joint(x, y)
+        self._paint_joint(x + 1, y)
+        self.dirty.append((col0, row, col1 + line_width, row + line_width))
+      else:
+        col = self.cols[x]
+        row0 = self.rows[y + 1]
+        row1 = self.rows[y]
+        self.slots[row0 + line_width:row1, col:col + line_width] = slot
+        self._paint_joint(x, y)
+        self._paint_joint(x, y + 1)
+        self.dirty.append((col, row0, col + line_width, row1 + line_width))
+
+  # Returns and clears the list of (x0, y0, x1, y1) boxes of the pixels
+  # painted since the last call.
+  def take_dirty(self):
+    dirty = self.dirty
+    self.dirty = []
+    return dirty
+
+  # Returns the current frame, or the box = (x0, y0, x1, y1) part of it, as a
+  # paletted image.
+  def image(self, box=None, background=Canvas.COLORS['WHITE']):
+    slots = self.slots
+    if box is not None:
+      slots = slots[box[1]:box[3], box[0]:box[2]]
+    image = Image.fromarray(np.ascontiguousarray(slots))
+    image.putpalette([c for color in self.palette(background)
+                      for c in color[0:3]])
+    return image
+
+
+# Streams frames into an animated GIF. Each frame only covers the bounding
+# box of what changed since the previous one, with the pixels that didn't
+# change left transparent so that they compress to almost nothing.
+class GifWriter(object):
+
+  # duration is in milliseconds per frame, and loop is the number of times to
+  # play the animation (0 for forever).
+  def __init__(self, filename, renderer, duration=40, loop=0,
+               background=Canvas.COLORS['WHITE']):
+    self.file = open(filename, 'wb')
+    self.renderer = renderer
+    self.duration = duration
+    self.loop = loop
+    palette = renderer.palette(background)
+    # An extra palette entry for unchanged pixels, if there's room for one.
+    self.transparent = len(palette) if len(palette) < 256 else None
+    self.palette = [c for color in palette for c in color[0:3]]
+    if self.transparent is not None:
+      self.palette += [0, 0, 0]
+    self.previous = None
+    self.frames = 0
+
+  def _image(self, slots):
+    image = Image.fromarray(np.ascontiguousarray(slots))
+    image.putpalette(self.palette)
+    return image
+
+  def write_frame(self):
+    boxes = self.renderer.take_dirty()
+    if not boxes:
+      return
+    slots = self.renderer.slots
+    params = {'duration': self.duration}
+    if not self.frames:
+      header, _ = GifImagePlugin.getheader(
+          self._image(slots), info={'duration': self.duration})
+      self.file.write(b''.join(header))
+      params['loop'] = self.loop
+      box = (0, 0, self.renderer.width, self.renderer.height)
+      frame = slots
+      self.previous = slots.copy()
+    else:
+      box = (
+          min(b[0] for b in boxes), min(b[1] for b in boxes),
+          max(b[2] for b in boxes), max(b[3] for b in boxes))
+      # Pillow's GIF encoder gets images one pixel wide wrong, so those
+      # frames take in a neighboring column as well (which just comes out
+      # transparent).
+      if box[2] - box[0] < 2:
+        if box[2] < self.renderer.width:
+          box = (box[0], box[1], box[2] + 1, box[3])
+        else:
+          box = (box[0] - 1, box[1], box[2], box[3])
+      frame = slots[box[1]:box[3], box[0]:box[2]]
+      previous = self.previous[box[1]:box[3], box[0]:box[2]]
+      if self.transparent is not None:
+        params['transparency'] = self.transparent
+        # Leave the previous frame in place under the transparent pixels.
+        params['disposal'] = 1
+        frame = np.where(frame == previous, self.transparent, frame).astype(
+            np.uint8)
+      previous[:] = slots[box[1]:box[3], box[0]:box[2]]
+    data = GifImagePlugin.getdata(
+        self._image(frame), offset=box[0:2], **params)
+    self.file.write(b''.join(data))
+    self.frames += 1
+
+  def close(self):
+    if self.frames:
+      self.file.write(b';')
+    self.file.close()
+
+
+# Streams frames as raw 8-bit RGB video to a file object, e.g. a pipe into
+#
+#   ffmpeg -f rawvideo -pix_fmt rgb24 -s <width>x<height> -i - out.mp4
+class RawFrameWriter(object):
+
+  def __init__(self, out, renderer, background=Canvas.COLORS['WHITE']):
+    self.out = out
+    self.renderer = renderer
+    self.colors = np.array(
+        [color[0:3] for color in renderer.palette(background)],
+        dtype=np.uint8)
+    self.frames = 0
+
+  def write_frame(self):
+    if not self.renderer.take_dirty() and self.frames:
+      return
+    self.out.write(self.colors[self.renderer.slots].tobytes())
+    self.frames += 1
+
+  def close(self):
+    self.out.flush()
+
+
+# Generates the maze, writing a frame with writer every `every` steps and once
+# more at the end. Returns the number of steps.
+def animate_generation(maze, same_branch_probability, renderer, writer,
+                       every=1):
+  step = 0
+  for step, changed in maze.generate_each_wall(
+      same_branch_probability, report_changes=True):
+    if step == 0:
+      renderer.reset()
+    else:
+      renderer.update(changed.tolist())
+    if step % every == 0:
+      writer.write_frame()
+  writer.write_frame()
+  return step
@@ -0,0 +1,72 @@
+#!/usr/bin/env python
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from PIL import Image
+from maze import Maze
+from canvas import Canvas
+from animation import FrameRenderer
+from animation import GifWriter
+
+
+# Writes generation animations to GIFs, reads them back and checks every
+# frame against the renderer's slots at the time it was written.
+class GifWriterTest(unittest.TestCase):
+
+  def setUp(self):
+    self.directory = tempfile.mkdtemp()
+
+  def tearDown(self):
+    shutil.rmtree(self.directory)
+
+  def check_animation(self, seed, width, height, pixels_per_square,
+                      line_width=1, colors=True):
+    random.seed(seed)
+    maze = Maze(width, height)
+    maze.create_border(maze.choose_exits(2))
+    renderer = FrameRenderer(
+        maze, pixels_per_square, line_width,
+        Canvas.random_color_list() if colors else None)
+    filename = os.path.join(self.directory, 'maze.gif')
+    writer = GifWriter(filename, renderer)
+    expected = []
+    for step, changed in maze.generate_each_wall(0.7, report_changes=True):
+      if step == 0:
+        renderer.reset()
+      else:
+        renderer.update(changed.tolist())
+      frames = writer.frames
+      writer.write_frame()
+      if writer.frames > frames:
+        expected.append(renderer.slots.copy())
+    writer.close()
+
+    palette = np.array(
+        [color[0:3] for color in renderer.palette()], dtype=np.uint8)
+    image = Image.open(filename)
+    for i, slots in enumerate(expected):
+      image.seek(i)
+      self.assertTrue(
+          (np.array(image.convert('RGB')) == palette[slots]).all(),
+          'Frame %d differs' % i)
+    with self.assertRaises(EOFError):
+      image.seek(len(expected))
+
+  # Frames of a single vertical wall segment are one pixel wide.
+  def test_narrow_frames(self):
+    self.check_animation(5, 15, 10, 3)
+    self.check_animation(3, 9, 6, 2.5)
+
+  def test_wide_lines(self):
+    self.check_animation(4, 20, 13, 5, line_width=3)
+
+  def test_black_and_white(self):
+    self.check_animation(2, 12, 8, 4, colors=False)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,317 @@
+#!/usr/bin/env python
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import sys
+import time
+import traceback
+import analysis
+import engines
+from cache import MazeCache
+from maze import Maze
+from canvas import Canvas
+from canvas import IndexCanvas
+
+# Generates and renders mazes in bulk from a JSON job spec, e.g.
+#
+#   {
+#     "count": 1000,
+#     "sizes": [[20, 20], [30, 40]],
+#     "exits": 2,
+#     "same_branch_probability": 0.9,
+#     "output": "out/maze_{index:04d}.png",
+#     "seed": 1234
+#   }
+#
+# The spec can also be a list of such objects, which are run one after the
+# other with consecutive indices. Fields:
+#
+#   count                    Number of mazes (default 1).
+#   sizes                    [width, height] pairs, used round-robin.
+#   exits                    Number of random exits, or a list of
+#                            Maze.border_edges names (default 2).
+#   engine                   "walls" for the wall growing engine or
+#                            "kruskal" for engines.KruskalEngine (default
+#                            "walls").
+#   same_branch_probability  Passed to the wall growing engine (default 1.0).
+#   template                 Template image (see maze_from_template.py),
+#                            used instead of sizes and exits.
+#   output                   Output filename pattern, formatted with index,
+#                            width, height and seed.
+#   style                    "page" for a black and white and a colored copy
+#                            on a letter page, "color" or "bw" for a single
+#                            copy (default "page").
+#   seed                     Seed for the per-job seeds (default random).
+#   accept                   Limits on analysis.analyze metrics that every
+#                            maze must meet, e.g. {"perfect": true,
+#                            "min_solution_length": 100} (default none).
+#   attempts                 Number of mazes to generate for a job before
+#                            giving up on meeting accept (default 10).
+#   cache                    Directory of a cache.MazeCache to reuse mazes
+#                            and pages from, which can be shared between
+#                            batches (default none).
+#   cache_max_mb             Size limit of the cache (default 1024).
+#
+# Each job gets its own seed, drawn up front from the spec's seed, so a batch
+# is reproducible no matter how many processes run it or in which order the
+# jobs finish. A result line is written as JSON for every job as soon as it's
+# done, and a job that fails is reported without stopping the others.
+
+# Maximum percent of available space to occupy
+MAX_IMAGE_SIZE = 0.85
+
+
+# Expands a job spec into a list of job dicts.
+def expand_spec(spec):
+  specs = spec if isinstance(spec, list) else [spec]
+  jobs = []
+  for spec in specs:
+    rng = random.Random(spec.get('seed'))
+    sizes = spec.get('sizes', [[20, 20]])
+    attempts = spec.get('attempts', 10)
+    if attempts < 1:
+      raise ValueError('attempts must be at least 1, not %r' % attempts)
+    for i in xrange(0, spec.get('count', 1)):
+      width, height = sizes[i % len(sizes)]
+      jobs.append({
+          'index': len(jobs),
+          'width': width,
+          'height': height,
+          'exits': spec.get('exits', 2),
+          'engine': spec.get('engine', 'walls'),
+          'same_branch_probability': spec.get('same_branch_probability', 1.0),
+          'template': spec.get('template'),
+          'output': spec['output'],
+          'style': spec.get('style', 'page'),
+          'seed': rng.getrandbits(32),
+          'accept': spec.get('accept', {}),
+          'attempts': attempts,
+          'cache': spec.get('cache'),
+          'cache_max_mb': spec.get('cache_max_mb', 1024),
+      })
+  return jobs
+
+
+# Snapshots of the templates this process has loaded, by filename.
+_template_snapshots = {}
+
+
+def create_maze(job):
+  initialize = True
+  if job['template']:
+    # Imported here so that PIL is only needed for template jobs.
+    from maze_from_template import load_template_snapshot
+    # Loading and initializing the template is only done once per process,
+    # and every maze is forked from it.
+    snapshot = _template_snapshots.get(job['template'])
+    if snapshot is None:
+      snapshot = load_template_snapshot(job['template'])
+      _template_snapshots[job['template']] = snapshot
+    maze = snapshot.fork()
+    initialize = False
+  else:
+    maze = Maze(job['width'], job['height'])
+    exits = job['exits']
+    if isinstance(exits, list):
+      exits = [maze.border_edges[name] for name in exits]
+    else:
+      exits = maze.choose_exits(exits)
+    maze.create_border(exits)
+  if job['engine'] == 'walls':
+    engine = engines.WallGrowingEngine(
+        job['same_branch_probability'], initialize=initialize)
+  elif job['engine'] == 'kruskal':
+    engine = engines.KruskalEngine()
+  else:
+    raise ValueError('Unknown engine %r' % job['engine'])
+  maze.generate(engine)
+  return maze
+
+
+def render(maze, style):
+  full_canvas = IndexCanvas(size=Canvas.LETTER, dpi=300)
+  if style == 'page':
+    # A copy with all walls black in the top half and a copy with colored
+    # walls in the bottom half
+    half_height = full_canvas.height / 2
+    box_size = (
+        int(full_canvas.width * MAX_IMAGE_SIZE),
+        int(half_height * MAX_IMAGE_SIZE))
+    bw_box = (
+        (full_canvas.width - box_size[0]) / 2,
+        (half_height - box_size[1]) / 2,
+        box_size[0],
+        box_size[1])
+    color_box = (bw_box[0], bw_box[1] + half_height, box_size[0], box_size[1])
+    maze.draw_in_box(full_canvas, bw_box, index=IndexCanvas.BLACK)
+    maze.draw_in_box(full_canvas, color_box)
+  elif style in ('color', 'bw'):
+    box_size = (
+        int(full_canvas.width * MAX_IMAGE_SIZE),
+        int(full_canvas.height * MAX_IMAGE_SIZE))
+    box = (
+        (full_canvas.width - box_size[0]) / 2,
+        (full_canvas.height - box_size[1]) / 2,
+        box_size[0],
+        box_size[1])
+    maze.draw_in_box(
+        full_canvas, box,
+        index=IndexCanvas.BLACK if style == 'bw' else None)
+  else:
+    raise ValueError('Unknown style %r' % style)
+  return full_canvas
+
+
+# Metrics of analysis.analyze reported in the results.
+RESULT_METRICS = [
+    'perfect', 'unreachable_cells', 'dead_ends', 'junctions',
+    'branching_factor', 'solution_length']
+
+
+# Generates mazes for the job until one meets its accept limits, and returns
+# it with its metrics and the number of attempts it took.
+def create_accepted_maze(job):
+  for attempt in xrange(1, job['attempts'] + 1):
+    maze = create_maze(job)
+    metrics = analysis.analyze(maze)
+    failed = analysis.rejections(metrics, job['accept'])
+    if not failed:
+      return maze, metrics, attempt
+  raise ValueError('No maze met %s in %d attempts' % (
+      ', '.join(failed), job['attempts']))
+
+
+# Returns the cache key of the maze a job makes, from everything that goes
+# into making it.
+def maze_key(job):
+  params = dict((name, job[name]) for name in [
+      'width', 'height', 'exits', 'engine', 'same_branch_probability',
+      'seed', 'accept', 'attempts'])
+  template_data = None
+  if job['template']:
+    with open(job['template'], 'rb') as f:
+      template_data = f.read()
+  return MazeCache.key(params, template_data)
+
+
+# Runs a single job and returns its result. Any error is caught and returned
+# in the result, so that one bad job doesn't take down the batch.
+def run_job(job):
+  start = time.time()
+  result = {'index': job['index'], 'seed': job['seed']}
+  try:
+    cache = None
+    maze = None
+    if job['cache']:
+      cache = MazeCache(job['cache'], int(job['cache_max_mb'] * (1 << 20)))
+      key = maze_key(job)
+      maze = cache.load_maze(key)
+    cached = maze is not None
+    random.seed(job['seed'])
+    if not cached:
+      maze, metrics, attempts = create_accepted_maze(job)
+      if cache is not None:
+        cache.save_maze(key, maze)
+    else:
+      metrics = analysis.analyze(maze)
+      attempts = 0
+    # The colors have a generator of their own, so that they're the same
+    # whether or not the maze came from the cache.
+    color_list = Canvas.random_color_list(random.Random(job['seed']))
+    output = job['output'].format(
+        index=job['index'], width=maze.width, height=maze.height,
+        seed=job['seed'])
+    directory = os.path.dirname(output)
+    if directory and not os.path.isdir(directory):
+      try:
+        os.makedirs(directory)
+      except OSError:
+        # Another worker may have just created it.
+        if not os.path.isdir(directory):
+          raise
+    # Pages are cached by style and file type.
+    page_name = job['style'] + os.path.splitext(output)[1]
+    page = cache.page_filename(key, page_name) if cache is not None else None
+    if page is not None:
+      try:
+        shutil.copyfile(page, output)
+      except (IOError, OSError):
+        # Evicted by another process since the hit.
+        page = None
+    if page is None:
+      render(maze, job['style']).save(output, color_list)
+      if cache is not None:
+        cache.save_page(key, page_name, output)
+    result.update({
+        'output': output,
+        'width': maze.width,
+        'height': maze.height,
+        'walls': maze.num_walls(),
+        'attempts': attempts,
+        'cached': cached,
+        'metrics': dict((name, metrics[name]) for name in RESULT_METRICS),
+    })
+  except Exception:
+    result['error'] = traceback.format_exc()
+  result['seconds'] = time.time() - start
+  return result
+
+
+# Runs all the jobs on a pool of processes (one per core unless processes is
+# given) and yields their results in the order they finish.
+def run_batch(jobs, processes=None):
+  if processes == 1:
+    for job in jobs:
+      yield run_job(job)
+    return
+  pool = multiprocessing.Pool(processes)
+  try:
+    for result in pool.imap_unordered(run_job, jobs):
+      yield result
+  finally:
+    pool.terminate()
+    pool.join()
+
+
+def main():
+  parser = argparse.ArgumentParser(
+      description='Generate and render mazes from a JSON job spec.')
+  parser.add_argument('spec', help='JSON job spec file, or - for stdin')
+  parser.add_argument(
+      '-j', '--processes', type=int, default=None,
+      help='Number of worker processes (default: one per core)')
+  parser.add_argument(
+      '-r', '--results', default=None,
+      help='File to write JSON result lines to (default: stdout)')
+  args = parser.parse_args()
+
+  if args.spec == '-':
+    spec = json.load(sys.stdin)
+  else:
+    with open(args.spec) as f:
+      spec = json.load(f)
+  jobs = expand_spec(spec)
+
+  out = open(args.results, 'w') if args.results else sys.stdout
+  failed = 0
+  try:
+    for result in run_batch(jobs, args.processes):
+      if 'error' in result:
+        failed += 1
+      out.write(json.dumps(result, sort_keys=True) + '\n')
+      out.flush()
+  finally:
+    if out is not sys.stdout:
+      out.close()
+
+  if failed:
+    sys.stderr.write('%d of %d jobs failed\n' % (failed, len(jobs)))
+    exit(1)
+
+
+if __name__ == '__main__':
+  main()
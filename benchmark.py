@@ -0,0 +1,314 @@
+#!/usr/bin/env python
+
+import argparse
+import imp
+import io
+import json
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+import numpy as np
+
+# Benchmarks for the hot paths of the library. Every measurement runs in a
+# fresh Python process, so that its peak memory isn't inflated by the cases
+# that ran before it, and results are written as JSON:
+#
+#   ./benchmark.py -o results.json
+#   ./benchmark.py -o new.json --baseline results.json --plot plots/
+#
+# With --baseline, each result is compared against the matching one in the
+# baseline and anything slower by more than --threshold, and by at least
+# --min-delta seconds, is reported as a regression. --plot draws time and
+# memory against size for every case, and needs matplotlib.
+#
+# The time of a case is the fastest of its runs. Cases that take only a few
+# milliseconds are run more than --repeat times, until they've run for
+# MIN_CASE_SECONDS in total, so that their times aren't just noise.
+
+def _generated_maze(size, same_branch_probability=1.0):
+  from maze import Maze
+  maze = Maze(size, size)
+  maze.create_border(maze.choose_exits(2))
+  maze.generate_all_walls(same_branch_probability)
+  return maze
+
+
+# Each case takes its params and does any setup that shouldn't be timed, then
+# returns the function to time.
+
+def case_generate(size, same_branch_probability):
+  from maze import Maze
+  maze = Maze(size, size)
+  maze.create_border(maze.choose_exits(2))
+  return lambda: maze.generate_all_walls(same_branch_probability)
+
+
+def case_kruskal(size):
+  from engines import KruskalEngine
+  from maze import Maze
+  maze = Maze(size, size)
+  maze.create_border(maze.choose_exits(2))
+  return lambda: maze.generate(KruskalEngine())
+
+
+def case_render(size):
+  from canvas import Canvas
+  maze = _generated_maze(size)
+  color_list = Canvas.random_color_list()
+  def run():
+    canvas = maze.create_canvas(4, color_list)
+    canvas.fill_rgb(Canvas.COLORS['WHITE'][:3])
+  return run
+
+
+def case_template(size):
+  from PIL import Image
+  from maze import Edge
+  from maze import Maze
+  from maze_from_template import load_template
+  # A template with just a border, which is filled in when loaded.
+  maze = Maze(size, size)
+  maze.create_border(maze.choose_exits(2))
+  pixels = np.zeros((2 * size + 1, 2 * size + 1, 4), dtype=np.uint8)
+  flipped = pixels[::-1]
+  flipped[0::2, 1::2][maze.edge_blocks[Edge.HORZ] >= 0] = [0, 0, 0, 255]
+  flipped[1::2, 0::2][maze.edge_blocks[Edge.VERT] >= 0] = [0, 0, 0, 255]
+  png = io.BytesIO()
+  Image.fromarray(pixels, 'RGBA').save(png, 'PNG')
+  def run():
+    png.seek(0)
+    load_template(png).generate_all_walls(1.0)
+  return run
+
+
+def case_template_fork(size):
+  from maze import Maze
+  # A template with just a border, loaded and initialized once.
+  maze = Maze(size, size)
+  maze.create_border(maze.choose_exits(2))
+  maze.initialize_state_from_edges()
+  snapshot = maze.snapshot()
+  return lambda: snapshot.fork().generate_all_walls(1.0, initialize=False)
+
+
+def case_hierarchical(size, processes):
+  from hierarchical import HierarchicalMaze
+  layout = _generated_maze(size, 0.7)
+  hierarchical = HierarchicalMaze(layout, 9, 9)
+  return lambda: hierarchical.generate(0.9, processes=processes)
+
+
+def case_hilbert(size):
+  from maze_hilbert import draw_hilbert
+  return lambda: draw_hilbert(size)
+
+
+CASES = {
+  'generate': case_generate,
+  'kruskal': case_kruskal,
+  'render': case_render,
+  'template': case_template,
+  'template_fork': case_template_fork,
+  'hierarchical': case_hierarchical,
+  'hilbert': case_hilbert,
+}
+
+# (case, params) for every measurement, with the size param plotted on the x
+# axis.
+SUITE = (
+    [('generate', {'size': size, 'same_branch_probability': p})
+     for p in [0.0, 0.5, 1.0] for size in [50, 100, 200, 400]]
+    + [('kruskal', {'size': size}) for size in [50, 100, 200, 400, 1000]]
+    + [('render', {'size': size}) for size in [50, 100, 200, 400]]
+    + [('template', {'size': size}) for size in [50, 100, 200]]
+    + [('template_fork', {'size': size}) for size in [50, 100, 200]]
+    + [('hierarchical', {'size': size, 'processes': processes})
+       for processes in [1, None] for size in [4, 8, 16]]
+    + [('hilbert', {'size': size}) for size in [64, 128, 256, 512]])
+
+QUICK_SUITE = [
+    (name, params) for name, params in SUITE if params['size'] <= 100]
+
+# Short cases are repeated until they've run for this long, but at most
+# MAX_REPEAT_FACTOR times as often as asked for.
+MIN_CASE_SECONDS = 1.0
+MAX_REPEAT_FACTOR = 20
+
+
+def _peak_rss_kb():
+  peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+  # ru_maxrss is in bytes on macOS and in kilobytes everywhere else.
+  if sys.platform == 'darwin':
+    peak /= 1024
+  return peak
+
+
+# Runs a single measurement in this process and returns its result.
+def run_case(name, params, repeat, seed):
+  base_rss = _peak_rss_kb()
+  times = []
+  i = 0
+  while i < repeat or (
+      sum(times) < MIN_CASE_SECONDS and i < repeat * MAX_REPEAT_FACTOR):
+    random.seed(seed + i)
+    np.random.seed(seed + i)
+    run = CASES[name](**params)
+    start = time.time()
+    run()
+    times.append(time.time() - start)
+    i += 1
+  return {
+      'case': name,
+      'params': params,
+      'seconds': min(times),
+      'all_seconds': times,
+      'peak_rss_kb': _peak_rss_kb(),
+      'base_rss_kb': base_rss,
+  }
+
+
+# Runs a single measurement in a new process and returns its result.
+def run_case_in_subprocess(name, params, repeat, seed):
+  output = subprocess.check_output([
+      sys.executable, os.path.abspath(__file__), '--case', name,
+      '--params', json.dumps(params), '--repeat', str(repeat),
+      '--seed', str(seed)])
+  return json.loads(output)
+
+
+def _key(result):
+  return (result['case'], json.dumps(result['params'], sort_keys=True))
+
+
+# Returns (result, baseline result, time ratio) for every result that's also
+# in the baseline.
+def compare(results, baseline):
+  by_key = dict((_key(result), result) for result in baseline)
+  comparisons = []
+  for result in results:
+    old = by_key.get(_key(result))
+    if old is not None:
+      comparisons.append((result, old, result['seconds'] / old['seconds']))
+  return comparisons
+
+
+def plot(results, directory):
+  # matplotlib is only needed for plotting.
+  import matplotlib
+  matplotlib.use('Agg')
+  import matplotlib.pyplot as plt
+  if not os.path.isdir(directory):
+    os.makedirs(directory)
+  for name in sorted(set(result['case'] for result in results)):
+    series = {}
+    for result in results:
+      if result['case'] != name:
+        continue
+      label = ', '.join(
+          '%s=%s' % (k, v) for k, v in sorted(result['params'].items())
+          if k != 'size') or name
+      series.setdefault(label, []).append(result)
+    figure, (time_axis, memory_axis) = plt.subplots(1, 2, figsize=(12, 5))
+    for label, points in sorted(series.items()):
+      points.sort(key=lambda result: result['params']['size'])
+      sizes = [result['params']['size'] for result in points]
+      time_axis.plot(
+          sizes, [result['seconds'] for result in points], 'o-', label=label)
+      memory_axis.plot(
+          sizes, [result['peak_rss_kb'] / 1024. for result in points], 'o-',
+          label=label)
+    for axis in [time_axis, memory_axis]:
+      axis.set_xscale('log', basex=2)
+      axis.set_xlabel('size')
+      axis.legend(loc='upper left')
+    time_axis.set_yscale('log')
+    time_axis.set_ylabel('seconds')
+    memory_axis.set_ylabel('peak RSS (MB)')
+    figure.suptitle(name)
+    figure.savefig(os.path.join(directory, '%s.png' % name))
+    plt.close(figure)
+
+
+def main():
+  parser = argparse.ArgumentParser(description='Benchmark maze-kit.')
+  parser.add_argument('-o', '--output', help='Write results to this JSON file')
+  parser.add_argument('--baseline', help='Compare against this results file')
+  parser.add_argument(
+      '--threshold', type=float, default=1.1,
+      help='Time ratio over the baseline reported as a regression')
+  parser.add_argument(
+      '--min-delta', type=float, default=0.005,
+      help='Seconds a case must change by to be reported as a regression or '
+      'as faster, whatever its ratio')
+  parser.add_argument('--plot', help='Write scaling plots to this directory')
+  parser.add_argument(
+      '--only', action='append', choices=sorted(CASES.keys()),
+      help='Only run these cases')
+  parser.add_argument(
+      '--quick', action='store_true', help='Only run the small sizes')
+  parser.add_argument('--repeat', type=int, default=3)
+  parser.add_argument('--seed', type=int, default=0)
+  # Used internally to run a single measurement in a subprocess.
+  parser.add_argument('--case', help=argparse.SUPPRESS)
+  parser.add_argument('--params', help=argparse.SUPPRESS)
+  args = parser.parse_args()
+
+  if args.case:
+    result = run_case(
+        args.case, json.loads(args.params), args.repeat, args.seed)
+    print json.dumps(result)
+    return
+
+  if args.plot:
+    # Checked up front, so that the benchmarks aren't run for nothing.
+    try:
+      imp.find_module('matplotlib')
+    except ImportError:
+      parser.error('--plot needs matplotlib')
+
+  suite = QUICK_SUITE if args.quick else SUITE
+  results = []
+  for name, params in suite:
+    if args.only and name not in args.only:
+      continue
+    result = run_case_in_subprocess(name, params, args.repeat, args.seed)
+    results.append(result)
+    print '%-14s %-45s %9.4fs %8.1fMB' % (
+        name, json.dumps(params, sort_keys=True), result['seconds'],
+        result['peak_rss_kb'] / 1024.)
+    sys.stdout.flush()
+
+  if args.output:
+    with open(args.output, 'w') as f:
+      json.dump(results, f, indent=2, sort_keys=True)
+
+  regressions = 0
+  if args.baseline:
+    with open(args.baseline) as f:
+      baseline = json.load(f)
+    print ''
+    for result, old, ratio in compare(results, baseline):
+      delta = result['seconds'] - old['seconds']
+      if ratio > args.threshold and delta >= args.min_delta:
+        verdict = 'REGRESSION'
+        regressions += 1
+      elif ratio < 1. / args.threshold and -delta >= args.min_delta:
+        verdict = 'faster'
+      else:
+        verdict = ''
+      print '%-14s %-45s %6.2fx %s' % (
+          result['case'], json.dumps(result['params'], sort_keys=True),
+          ratio, verdict)
+
+  if args.plot:
+    plot(results, args.plot)
+
+  if regressions:
+    exit(1)
+
+
+if __name__ == '__main__':
+  main()
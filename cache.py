@@ -0,0 +1,216 @@
+import contextlib
+import errno
+import fcntl
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+import mazefile
+
+# An on-disk cache of generated mazes and their rendered pages, shared by any
+# number of processes. Entries are keyed by a hash of everything that went
+# into making them (see MazeCache.key) and laid out as
+#
+#   <directory>/<first 2 hex digits of key>/<key>.maze
+#   <directory>/<first 2 hex digits of key>/<key>.<name>
+#
+# where .maze files are in the mazefile format and the others are rendered
+# pages. Every file is written to a temporary file in the same directory and
+# renamed into place, so readers only ever see whole files. Hits touch the
+# file.
+#
+# The total size of the files is kept in <directory>/size, which is locked
+# while it's updated, so storing a file doesn't have to look at the others.
+# Only when the total grows past max_bytes (or isn't known yet) is the cache
+# scanned, the least recently used files removed and the total written
+# again. Files removed or replaced behind the cache's back make the total too
+# large, which just brings the next scan forward.
+
+# Bump to drop the entries made by older versions.
+CACHE_VERSION = 1
+
+DEFAULT_MAX_BYTES = 1 << 30
+
+MAZE_SUFFIX = '.maze'
+
+SIZE_FILENAME = 'size'
+
+
+def _makedirs(directory):
+  if not os.path.isdir(directory):
+    try:
+      os.makedirs(directory)
+    except OSError:
+      # Another process may have just created it.
+      if not os.path.isdir(directory):
+        raise
+
+
+# Returns the total in a locked size file, or None if it hasn't been written.
+def _read_size(fd):
+  os.lseek(fd, 0, os.SEEK_SET)
+  text = os.read(fd, 32).strip()
+  return int(text) if text else None
+
+
+def _write_size(fd, total):
+  os.lseek(fd, 0, os.SEEK_SET)
+  os.ftruncate(fd, 0)
+  os.write(fd, b'%d' % total)
+
+
+def _remove(filename):
+  try:
+    os.remove(filename)
+  except OSError as e:
+    # Another process may have evicted it already.
+    if e.errno != errno.ENOENT:
+      raise
+
+
+class MazeCache(object):
+
+  def __init__(self, directory, max_bytes=DEFAULT_MAX_BYTES):
+    self.directory = directory
+    self.max_bytes = max_bytes
+
+  # Returns the key for a dict of parameters, which must be JSON
+  # serializable, and the contents of the template file if the maze is made
+  # from one.
+  @staticmethod
+  def key(params, template_data=None):
+    digest = hashlib.sha256()
+    digest.update(json.dumps(
+        [CACHE_VERSION, mazefile.VERSION, params], sort_keys=True))
+    if template_data is not None:
+      digest.update(b'\x00')
+      digest.update(template_data)
+    return digest.hexdigest()
+
+  def filename(self, key, suffix):
+    return os.path.join(self.directory, key[:2], key + suffix)
+
+  # Returns the cached filename for key and suffix if there is one, and marks
+  # it as just used.
+  def _hit(self, key, suffix):
+    filename = self.filename(key, suffix)
+    try:
+      os.utime(filename, None)
+    except OSError:
+      return None
+    return filename
+
+  # Writes the cache file for key and suffix with write(temp_filename) and
+  # renames it into place.
+  def _store(self, key, suffix, write):
+    filename = self.filename(key, suffix)
+    directory = os.path.dirname(filename)
+    _makedirs(directory)
+    fd, temp = tempfile.mkstemp(suffix='.tmp', dir=directory)
+    os.close(fd)
+    try:
+      write(temp)
+      size = os.path.getsize(temp)
+      os.rename(temp, filename)
+    except:
+      _remove(temp)
+      raise
+    with self._locked_size() as size_fd:
+      total = _read_size(size_fd)
+      if total is not None:
+        total += size
+        _write_size(size_fd, total)
+      if total is None or total > self.max_bytes:
+        self._evict(size_fd)
+    return filename
+
+  # Opens and locks the size file, and yields its file descriptor. Other
+  # processes wait for the lock until it's closed.
+  @contextlib.contextmanager
+  def _locked_size(self):
+    _makedirs(self.directory)
+    fd = os.open(
+        os.path.join(self.directory, SIZE_FILENAME), os.O_RDWR | os.O_CREAT,
+        0644)
+    try:
+      fcntl.flock(fd, fcntl.LOCK_EX)
+      yield fd
+    finally:
+      os.close(fd)
+
+  # Returns the cached maze for key, or None. The maze is memory mapped
+  # copy-on-write where the file allows it, so it can be changed without
+  # changing the cache.
+  def load_maze(self, key):
+    filename = self._hit(key, MAZE_SUFFIX)
+    if filename is None:
+      return None
+    try:
+      return mazefile.load(filename, mode='c')
+    except (IOError, OSError):
+      # Evicted since the hit.
+      return None
+
+  def save_maze(self, key, maze):
+    return self._store(
+        key, MAZE_SUFFIX, lambda temp: mazefile.save(maze, temp))
+
+  # Returns the filename of the page cached for key under name (e.g.
+  # 'page.png'), or None.
+  def page_filename(self, key, name):
+    return self._hit(key, '.' + name)
+
+  # Caches a copy of the rendered page at filename under name, and returns
+  # the cached filename.
+  def save_page(self, key, name, filename):
+    return self._store(
+        key, '.' + name, lambda temp: shutil.copyfile(filename, temp))
+
+  # Returns (mtime, size, filename) for every cached file.
+  def _entries(self):
+    entries = []
+    if not os.path.isdir(self.directory):
+      return entries
+    for subdirectory in os.listdir(self.directory):
+      path = os.path.join(self.directory, subdirectory)
+      if not os.path.isdir(path):
+        continue
+      for name in os.listdir(path):
+        filename = os.path.join(path, name)
+        try:
+          stat = os.stat(filename)
+        except OSError:
+          continue
+        # Temporary files are being written by another process, unless
+        # they're an hour old (from a writer that crashed).
+        if name.endswith('.tmp') and stat.st_mtime > time.time() - 3600:
+          continue
+        entries.append((stat.st_mtime, stat.st_size, filename))
+    return entries
+
+  def size(self):
+    return sum(size for mtime, size, filename in self._entries())
+
+  # Removes the least recently used files until the cache fits in max_bytes.
+  def evict(self):
+    with self._locked_size() as fd:
+      self._evict(fd)
+
+  # Does evict() with the size file already locked.
+  def _evict(self, fd):
+    entries = sorted(self._entries())
+    total = sum(size for mtime, size, filename in entries)
+    for mtime, size, filename in entries:
+      if total <= self.max_bytes:
+        break
+      _remove(filename)
+      total -= size
+    _write_size(fd, total)
+
+  def clear(self):
+    with self._locked_size() as fd:
+      for mtime, size, filename in self._entries():
+        _remove(filename)
+      _write_size(fd, 0)
@@ -17,12 +17,13 @@ class Canvas:
     'WHITE': [255, 255, 255, 255],
   }
 
+  # Shuffles the colors with rng, e.g. a random.Random of its own.
   @staticmethod
-  def random_color_list():
+  def random_color_list(rng=random):
     color_list = [
         Canvas.COLORS[c] for c in Canvas.COLORS if c not in ['BLACK', 'WHITE']
     ]
-    random.shuffle(color_list)
+    rng.shuffle(color_list)
     return color_list
 
   def __init__(self, width=None, height=None, size=None, dpi=None, color=[0, 0, 0, 0]):
@@ -80,7 +81,119 @@ class Canvas:
         p[0, axis1] += axis1_inc
       self.image_data[self.height - 1 - p[0, 1], p[0, 0]] = color
 
+  # Draws many lines at once. segments is an (N, 4) array of integer
+  # (x0, y0, x1, y1) end points and colors is either one color or an (N, 4)
+  # array with one per line. The pixels come out the same as drawing each
+  # line in order with draw_line.
+  def draw_lines(self, segments, colors):
+    segments = np.asarray(segments, dtype=np.int64).reshape(-1, 4)
+    lines = np.arange(0, len(segments))
+    dx = segments[:, 2] - segments[:, 0]
+    dy = segments[:, 3] - segments[:, 1]
+    # As in draw_line, the line moves by one pixel a step along its major
+    # axis, and is drawn from its lower end on that axis.
+    major_y = np.abs(dx) <= np.abs(dy)
+    disp0 = np.where(major_y, dy, dx)
+    disp1 = np.where(major_y, dx, dy)
+    backward = disp0 < 0
+    x0 = np.where(backward, segments[:, 2], segments[:, 0])
+    y0 = np.where(backward, segments[:, 3], segments[:, 1])
+    modulus = np.abs(disp0)
+    slope = np.where(backward, -disp1, disp1)
+    lengths = modulus + 1
+
+    # Steps through the flattened image for one pixel along each axis.
+    step0 = np.where(major_y, -self.width, 1)
+    step1 = np.where(major_y, 1, -self.width) * np.sign(slope)
+    first = (self.height - 1 - y0) * self.width + x0
+    # Pixel i of the whole run is step k = i - offset of its line.
+    offsets = np.cumsum(lengths) - lengths
+    pixels = np.repeat(first - step0 * offsets, lengths)
+    pixels += np.repeat(step0, lengths) * np.arange(0, len(pixels))
+    slope = np.abs(slope)
+    if np.any(slope):
+      # draw_line steps along axis1 whenever its running remainder, starting
+      # at modulus / 2 and growing by slope a step, goes over modulus, which
+      # happens floor((modulus / 2 + k * slope - 1) / modulus) times in the
+      # first k steps.
+      line = np.repeat(lines, lengths)
+      k = np.arange(0, len(pixels)) - offsets[line]
+      k *= slope[line]
+      k += (modulus / 2 - 1)[line]
+      k //= np.maximum(modulus, 1)[line]
+      np.maximum(k, 0, out=k)
+      pixels += k * step1[line]
+
+    # Write whole RGBA pixels at once.
+    image = self.image_data.view(np.uint32).reshape(-1)
+    colors = np.asarray(colors, dtype=np.uint8)
+    if colors.ndim > 1:
+      # Only keep the last write to each pixel.
+      pixels, last = np.unique(pixels[::-1], return_index=True)
+      line = np.repeat(lines, lengths)
+      colors = colors[line[len(line) - 1 - last]]
+    image[pixels] = np.ascontiguousarray(colors).view(np.uint32).reshape(-1)
+
   def fill_rgb(self, rgb):
-    for y in xrange(0, len(self.image_data)):
-      for x in xrange(0, len(self.image_data[0])):
-        self.image_data[y, x][0:3] = rgb
+    self.image_data[:, :, 0:3] = rgb
+
+
+class IndexCanvas(Canvas):
+
+  # Special index values. Non-negative indices pick a color from a color list,
+  # wrapping around if there are more indices than colors.
+  EMPTY = -1
+  BLACK = -2
+
+  # PNG palettes are limited to 256 entries, two of which are reserved for the
+  # background and black.
+  MAX_COLORS = 254
+
+  def __init__(self, width=None, height=None, size=None, dpi=None, index=EMPTY):
+    if size is not None and dpi is not None:
+      width = int(size[0] * dpi)
+      height = int(size[1] * dpi)
+    self.width = width
+    self.height = height
+    self.image_data = np.full((height, width), index, dtype=np.int32)
+
+  # Returns the palette slot of every pixel: 0 for EMPTY, 1 for BLACK and
+  # 2 + (index % num_colors) for everything else.
+  def get_palette_indices(self, num_colors):
+    slots = np.zeros(self.image_data.shape, dtype=np.uint8)
+    colored = self.image_data >= 0
+    slots[colored] = 2 + self.image_data[colored] % num_colors
+    slots[self.image_data == IndexCanvas.BLACK] = 1
+    return slots
+
+  # Returns a paletted image colored with color_list, or a 1-bit black and
+  # white image if there's no color_list. An EMPTY background is transparent
+  # in the paletted image if the background color is.
+  def get_image(self, color_list=None, background=Canvas.COLORS['WHITE']):
+    if color_list is None:
+      white = np.where(self.image_data == IndexCanvas.EMPTY, 255, 0)
+      return Image.fromarray(white.astype(np.uint8)).convert(
+          '1', dither=Image.NONE)
+
+    num_colors = min(len(color_list), IndexCanvas.MAX_COLORS)
+    palette = [background, Canvas.COLORS['BLACK']] + color_list[:num_colors]
+    image = Image.fromarray(self.get_palette_indices(num_colors))
+    image.putpalette([c for color in palette for c in color[0:3]])
+    if background[3] == 0:
+      image.info['transparency'] = 0
+    return image
+
+  def save(self, filename, color_list=None):
+    self.get_image(color_list).save(filename)
+
+  # Returns an RGBA canvas colored with color_list, with a transparent
+  # background.
+  def get_canvas(self, color_list):
+    canvas = Canvas(self.width, self.height)
+    colored = self.image_data >= 0
+    colors = np.asarray(color_list, dtype=np.uint8)
+    canvas.image_data[colored] = colors[
+        self.image_data[colored] % len(colors)]
+    canvas.image_data[self.image_data == IndexCanvas.BLACK] = (
+        Canvas.COLORS['BLACK'])
+    return canvas
@@ -0,0 +1,212 @@
+import random
+import struct
+import zlib
+import numpy as np
+import unionfind
+from maze import Edge
+from maze import Maze
+
+# A maze generator that only needs one row of the maze in memory at a time,
+# using Eller's algorithm, so mazes can be any height and written out as
+# they're generated. Rows are generated from the top of the maze down.
+
+
+class EllerMaze(object):
+
+  # exits are border edges left open, as in Maze.create_border.
+  # join_probability is the chance of joining two neighboring cells of a row
+  # that aren't connected yet, and down_probability the chance of a cell
+  # connecting to the cell below it (every group of connected cells in a row
+  # gets at least one connection down).
+  def __init__(self, width, height, exits=None, join_probability=0.5,
+               down_probability=0.3, seed=None):
+    self.width = width
+    self.height = height
+    self.exits = list(exits or [])
+    self.join_probability = join_probability
+    self.down_probability = down_probability
+    self.seed = seed
+
+  # Returns num_exits random border edges, from the same edges as
+  # Maze.choose_exits.
+  def choose_exits(self, num_exits):
+    width = self.width
+    height = self.height
+    edges = (
+        [Edge(Edge.HORZ, x, 0) for x in xrange(0, width - 1)]
+        + [Edge(Edge.VERT, width, y) for y in xrange(0, height - 1)]
+        + [Edge(Edge.HORZ, x, height) for x in xrange(1, width)]
+        + [Edge(Edge.VERT, 0, y) for y in xrange(1, height)])
+    return random.sample(edges, num_exits)
+
+  def _border_row(self, y):
+    row = np.zeros(self.width, dtype=np.int32)
+    for edge in self.exits:
+      if edge.ori == Edge.HORZ and edge.y == y:
+        row[edge.x] = Maze.EMPTY
+    return row
+
+  def _border_ends(self, vert, y):
+    vert[0] = vert[-1] = 0
+    for edge in self.exits:
+      if edge.ori == Edge.VERT and edge.y == y:
+        vert[edge.x] = Maze.EMPTY
+
+  # Yields the rows of edge states from the top of the maze down: first
+  # (height, HORZ row height, None), then (y, HORZ row y, VERT row y) for y
+  # from height - 1 down to 0, where the HORZ row is the one below the cells
+  # of row y. Walls are wall 0 and everything else is EMPTY, as in a Maze
+  # made with create_border and then generated.
+  def rows(self):
+    rng = np.random.RandomState(self.seed)
+    width = self.width
+    yield self.height, self._border_row(self.height), None
+
+    # The group of connected cells (so far) of every cell of the row.
+    groups = np.arange(width)
+    for y in xrange(self.height - 1, -1, -1):
+      last = y == 0
+      vert = np.zeros(width + 1, dtype=np.int32)
+      # Join neighboring cells of different groups, merging their groups.
+      # Only the cells where that's wanted and that start out in different
+      # groups are looked at one by one, to catch joins that would close a
+      # loop through a group merged earlier in the row.
+      candidates = groups[:-1] != groups[1:]
+      if not last:
+        candidates &= rng.random_sample(width - 1) < self.join_probability
+      # The group each merged group was merged into.
+      merged = {}
+      row = groups.tolist()
+      for x in np.nonzero(candidates)[0].tolist():
+        a = row[x]
+        while a in merged:
+          a = merged[a]
+        b = row[x + 1]
+        while b in merged:
+          b = merged[b]
+        if a != b:
+          if a < b:
+            merged[b] = a
+          else:
+            merged[a] = b
+          vert[x + 1] = Maze.EMPTY
+      if merged:
+        parent = np.arange(2 * width)
+        parent[merged.keys()] = merged.values()
+        groups = unionfind.flatten(parent)[groups]
+      self._border_ends(vert, y)
+
+      if last:
+        yield y, self._border_row(0), vert
+        return
+
+      # Connect cells down at random, and at least one cell of every group.
+      # Where a group has several cells, the one picked last in a random
+      # order wins.
+      down = rng.random_sample(width) < self.down_probability
+      order = rng.permutation(width)
+      picked = np.full(2 * width, -1)
+      picked[groups[order]] = order
+      down[picked[picked >= 0]] = True
+      horz = np.where(down, Maze.EMPTY, 0).astype(np.int32)
+      yield y, horz, vert
+
+      # Cells below keep the group they connect down from, relabeled as the
+      # position of one of its cells, and the others start groups of their
+      # own, labeled from width up.
+      position = np.empty(2 * width, dtype=int)
+      position[groups] = np.arange(width)
+      groups = np.where(down, position[groups], width + np.arange(width))
+
+  # Returns the whole maze as a Maze, which only makes sense for mazes that
+  # fit in memory.
+  def to_maze(self):
+    maze = Maze(self.width, self.height)
+    for y, horz, vert in self.rows():
+      maze.edge_blocks[Edge.HORZ][y] = horz
+      if vert is not None:
+        maze.edge_blocks[Edge.VERT][y] = vert
+    maze.exits = list(self.exits)
+    return maze
+
+
+# Writes a 1-bit black and white PNG a few rows at a time, so that the whole
+# image never has to be in memory.
+class PngRowWriter(object):
+
+  def __init__(self, filename, width, height):
+    self.file = open(filename, 'wb')
+    self.width = width
+    self.height = height
+    self.rows = 0
+    self.compressor = zlib.compressobj()
+    self.file.write(b'\x89PNG\r\n\x1a\n')
+    self._chunk(b'IHDR', struct.pack('>IIBBBBB', width, height, 1, 0, 0, 0, 0))
+
+  def _chunk(self, kind, data):
+    self.file.write(struct.pack('>I', len(data)))
+    self.file.write(kind)
+    self.file.write(data)
+    self.file.write(struct.pack('>I', zlib.crc32(kind + data) & 0xffffffff))
+
+  # Writes the next rows, given as a (rows, width) array that's True for black
+  # pixels.
+  def write_rows(self, black):
+    black = np.atleast_2d(black)
+    packed = np.packbits(~black, axis=1)
+    # Every scanline starts with filter type 0.
+    data = np.concatenate(
+        (np.zeros((len(packed), 1), dtype=np.uint8), packed), axis=1)
+    compressed = self.compressor.compress(data.tobytes())
+    if compressed:
+      self._chunk(b'IDAT', compressed)
+    self.rows += len(black)
+
+  def close(self):
+    if self.rows != self.height:
+      raise ValueError('Wrote %d of %d rows' % (self.rows, self.height))
+    self._chunk(b'IDAT', self.compressor.flush())
+    self._chunk(b'IEND', b'')
+    self.file.close()
+
+
+# Writes an EllerMaze to a black and white PNG as it's generated, with a
+# whole number of pixels_per_square and the same pixels as Maze.draw with
+# index=IndexCanvas.BLACK. Only a row of the maze and of the image are kept
+# in memory.
+def write_png(eller, filename, pixels_per_square, line_width=1):
+  if line_width > pixels_per_square:
+    raise ValueError('Lines can be at most one square wide')
+  width = eller.width * pixels_per_square + line_width
+  height = eller.height * pixels_per_square + line_width
+  writer = PngRowWriter(filename, width, height)
+
+  # The pixels covered by lines length pixels long from every grid column
+  # where drawn is set.
+  def spread(drawn, length):
+    pixels = np.zeros(width, dtype=bool)
+    starts = np.nonzero(Maze._drawn(drawn))[0] * pixels_per_square
+    for offset in xrange(0, length):
+      pixels[starts + offset] = True
+    return pixels
+
+  # A grid line is written once the VERT rows on both sides of it are known,
+  # since they run across it.
+  def write_line(horz, above, below):
+    line = spread(horz, pixels_per_square + line_width)
+    for vert in [above, below]:
+      if vert is not None:
+        line |= spread(vert, line_width)
+    writer.write_rows(np.tile(line, (line_width, 1)))
+
+  horz_line = None
+  above = None
+  for y, horz, vert in eller.rows():
+    if vert is not None:
+      write_line(horz_line, above, vert)
+      band = spread(vert, line_width)
+      writer.write_rows(np.tile(band, (pixels_per_square - line_width, 1)))
+    horz_line = horz
+    above = vert
+  write_line(horz_line, above, None)
+  writer.close()
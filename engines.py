@@ -0,0 +1,121 @@
+import random
+import numpy as np
+import unionfind
+from maze import Edge
+from maze import Maze
+
+# Generation engines for Maze.generate. An engine fills in the EMPTY edges of
+# a maze whose border and any template edges are already set, and leaves the
+# result in Maze.edges the same way generate_all_walls does: every wall
+# filled with its wall id, and RESERVED and PAINTED edges untouched.
+
+
+# Grows every wall one edge at a time, round robin (see
+# Maze.generate_each_wall). initialize=False is for mazes that are already
+# initialized, e.g. forked from a MazeSnapshot.
+class WallGrowingEngine(object):
+
+  def __init__(
+      self, same_branch_probability=1.0, observer=None, initialize=True):
+    self.same_branch_probability = same_branch_probability
+    self.observer = observer
+    self.initialize = initialize
+
+  def generate(self, maze):
+    maze.generate_all_walls(
+        self.same_branch_probability, self.observer, self.initialize)
+
+
+# Randomized Kruskal on the grid points. Every EMPTY edge inside the border
+# gets a random rank from a single permutation, and edges are added as walls
+# in rank order whenever they join a point to a wall, or two points neither
+# of which is on a wall yet, but never two walls (which would close off part
+# of the maze). All the existing walls and the border points are treated as a
+# single component for that, so a border point in a double-wide gap is never
+# joined to another wall, just as generate_all_walls grows it as a wall of its
+# own. Where points end up in a group that never reaches a wall (because
+# they're fenced in by RESERVED edges), their edges are left EMPTY, as
+# generate_all_walls would.
+#
+# Rather than adding edges one at a time, the edges are added in Boruvka
+# rounds: every component takes its lowest ranked edge to another component,
+# and they're all merged at once with an array union-find. With distinct
+# ranks that picks exactly the edges Kruskal would, in O(log points) rounds
+# of array operations.
+class KruskalEngine(object):
+
+  # The permutation is seeded from the random module unless a seed is given,
+  # so random.seed makes generation reproducible as it does for the default
+  # engine.
+  def __init__(self, seed=None):
+    self.seed = seed
+
+  def generate(self, maze):
+    seed = self.seed if self.seed is not None else random.getrandbits(32)
+    rng = np.random.RandomState(seed)
+    maze.params['engine'] = 'kruskal'
+    grid = maze.grid
+    edge_points = grid.edge_points.reshape(-1, 2)
+    # An extra node that every point on a wall is joined to.
+    walls = grid.num_points
+    num_nodes = grid.num_points + 1
+
+    border_points = np.ones((maze.height + 1, maze.width + 1), dtype=bool)
+    border_points[1:-1, 1:-1] = False
+    seeds = np.concatenate((
+        edge_points[maze.edges >= 0].ravel(),
+        np.nonzero(border_points.ravel())[0]))
+    parent = np.arange(num_nodes, dtype=np.int32)
+    parent[seeds] = walls
+
+    border = np.zeros(grid.num_edges, dtype=bool)
+    horz_border = border[:grid.edge_offset[Edge.VERT]].reshape(
+        maze.height + 1, maze.width)
+    vert_border = border[grid.edge_offset[Edge.VERT]:].reshape(
+        maze.height, maze.width + 1)
+    horz_border[[0, -1], :] = True
+    vert_border[:, [0, -1]] = True
+    candidates = np.nonzero((maze.edges == Maze.EMPTY) & ~border)[0]
+    candidates = candidates[rng.permutation(len(candidates))]
+    a = edge_points[candidates, 0]
+    b = edge_points[candidates, 1]
+
+    added = []
+    while len(candidates):
+      root_a = parent[a]
+      root_b = parent[b]
+      between = root_a != root_b
+      candidates = candidates[between]
+      a = a[between]
+      b = b[between]
+      if not len(candidates):
+        break
+      # The first edge of every component in rank order, scattered in reverse
+      # so that the first write of each component is the one that sticks.
+      components = np.column_stack(
+          (root_a[between], root_b[between])).ravel()
+      first_of = np.full(num_nodes, -1, dtype=np.int32)
+      first_of[components[::-1]] = np.arange(
+          len(components) - 1, -1, -1, dtype=np.int32)
+      roots = np.nonzero(first_of >= 0)[0].astype(np.int32)
+      first = first_of[roots]
+      chosen = np.zeros(len(candidates), dtype=bool)
+      chosen[first // 2] = True
+      added.append(candidates[chosen])
+      # Point every component at the one its edge leads to. Those pointers
+      # form trees, except where two components took the same edge, in which
+      # case the smaller one is kept as the root.
+      successor = np.arange(num_nodes, dtype=np.int32)
+      targets = components[first ^ 1]
+      successor[roots] = targets
+      kept = roots[(successor[targets] == roots) & (roots < targets)]
+      successor[kept] = kept
+      parent = unionfind.flatten(successor)[parent]
+
+    if added:
+      added = np.concatenate(added)
+      # Only keep the edges that ended up joined to a wall.
+      joined = parent[edge_points[added, 0]] == parent[walls]
+      maze.edges[added[joined]] = 0
+    # Number the new edges with the walls they joined.
+    maze.initialize_state_from_edges()
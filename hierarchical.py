@@ -0,0 +1,164 @@
+import multiprocessing
+import random
+import numpy as np
+from maze import Edge
+from maze import Maze
+
+# Exit of a sub-maze on each side of its square in the layout maze, in the
+# same order as Maze.square_edges.
+EXITS = [
+  # South
+  Maze.BOTTOM_MIDDLE,
+  # North
+  Maze.TOP_MIDDLE,
+  # West
+  Maze.MIDDLE_LEFT,
+  # East
+  Maze.MIDDLE_RIGHT,
+]
+
+# Walls on either side of the first square of the corridor leaving each exit,
+# relative to the exit edge.
+CORRIDOR_EDGES = [
+  # South
+  [
+    Edge(Edge.VERT, 0, -1),
+    Edge(Edge.VERT, 1, -1),
+  ],
+  # North
+  [
+    Edge(Edge.VERT, 0, 0),
+    Edge(Edge.VERT, 1, 0),
+  ],
+  # West
+  [
+    Edge(Edge.HORZ, -1, 0),
+    Edge(Edge.HORZ, -1, 1),
+  ],
+  # East
+  [
+    Edge(Edge.HORZ, 0, 0),
+    Edge(Edge.HORZ, 0, 1),
+  ],
+]
+
+CORRIDOR_DIR = [
+  # South
+  (0, -1),
+  # North
+  (0, 1),
+  # West
+  (-1, 0),
+  # East
+  (1, 0),
+]
+
+
+# Generates a single sub-maze from a (width, height, exits, probability, seed)
+# job, with exits given as keys of Maze.border_edges, and returns its edges.
+# This lives at module level so that it can be sent to worker processes.
+def generate_sub_maze(job):
+  width, height, exits, same_branch_probability, seed = job
+  random.seed(seed)
+  maze = Maze(width, height)
+  maze.create_border([maze.border_edges[name] for name in exits])
+  maze.generate_all_walls(same_branch_probability)
+  return maze.edges
+
+
+# A maze made of one width x height sub-maze per square of a layout maze,
+# spaced padding squares apart and linked by corridors wherever the layout
+# maze has no wall between two squares.
+class HierarchicalMaze(object):
+
+  def __init__(self, layout, width, height, padding=2):
+    self.layout = layout
+    self.width = width
+    self.height = height
+    self.padding = padding
+    self.total_width = (width + padding) * layout.width + padding
+    self.total_height = (height + padding) * layout.height + padding
+
+  # Returns, for each side in EXITS order, a [y, x] bool array of the layout
+  # squares that have an opening on that side.
+  def _open_sides(self):
+    horz = self.layout.edge_blocks[Edge.HORZ] < 0
+    vert = self.layout.edge_blocks[Edge.VERT] < 0
+    return [horz[:-1, :], horz[1:, :], vert[:, :-1], vert[:, 1:]]
+
+  # Returns the position of the bottom left corner of each sub-maze in the
+  # master maze.
+  def offset(self, x, y):
+    return (
+        self.padding + x * (self.width + self.padding),
+        self.padding + y * (self.height + self.padding))
+
+  # Generates the sub-mazes in a pool of processes (one per core unless
+  # processes is given; 1 generates them in this process) and assembles them
+  # into a master maze, which is returned. Each sub-maze is seeded from the
+  # random module of this process, so seeding it makes the result repeatable
+  # regardless of the number of processes.
+  def generate(self, same_branch_probability, processes=None):
+    open_sides = self._open_sides()
+    jobs = []
+    for y in xrange(0, self.layout.height):
+      for x in xrange(0, self.layout.width):
+        exits = [
+            name for name, is_open in zip(EXITS, open_sides)
+            if is_open[y, x]]
+        jobs.append((
+            self.width, self.height, exits, same_branch_probability,
+            random.getrandbits(32)))
+
+    if processes is None:
+      processes = multiprocessing.cpu_count()
+    if processes == 1:
+      results = map(generate_sub_maze, jobs)
+    else:
+      pool = multiprocessing.Pool(processes)
+      try:
+        results = pool.map(
+            generate_sub_maze, jobs,
+            chunksize=max(1, len(jobs) // (4 * processes)))
+      finally:
+        pool.close()
+        pool.join()
+
+    master = Maze(self.total_width, self.total_height)
+    for i, edges in enumerate(results):
+      self._blit(master, i % self.layout.width, i // self.layout.width, edges)
+    self._add_corridors(master, open_sides)
+
+    # Fix the edge coloring
+    master.initialize_state_from_edges()
+    return master
+
+  # Copies the edges of a sub-maze into its spot in the master maze.
+  def _blit(self, master, x, y, edges):
+    sub_maze = Maze(self.width, self.height, edges=edges)
+    x_offset, y_offset = self.offset(x, y)
+    for ori in [Edge.HORZ, Edge.VERT]:
+      block = sub_maze.edge_blocks[ori]
+      master.edge_blocks[ori][
+          y_offset:y_offset + block.shape[0],
+          x_offset:x_offset + block.shape[1]] = block
+
+  # Fills the walls of a corridor of length padding out of every open side of
+  # every sub-maze.
+  def _add_corridors(self, master, open_sides):
+    sub_maze = Maze(self.width, self.height)
+    for i, is_open in enumerate(open_sides):
+      ys, xs = np.nonzero(is_open)
+      x_offsets, y_offsets = self.offset(xs, ys)
+      exit_edge = sub_maze.border_edges[EXITS[i]]
+      padding_dir = CORRIDOR_DIR[i]
+      for corr_pos in xrange(0, self.padding):
+        for offset_from_exit in CORRIDOR_EDGES[i]:
+          ori = offset_from_exit.ori
+          corr_x = (
+              x_offsets + exit_edge.x + offset_from_exit.x
+              + padding_dir[0] * corr_pos)
+          corr_y = (
+              y_offsets + exit_edge.y + offset_from_exit.y
+              + padding_dir[1] * corr_pos)
+          master.edge_blocks[ori][corr_y, corr_x] = 0
@@ -1,8 +1,14 @@
+import collections
 import random
+import sys
 import numpy as np
-from canvas import Canvas
+import unionfind
+from PIL import Image
+from canvas import IndexCanvas
 
-class Edge:
+class Edge(object):
+
+  __slots__ = ('ori', 'x', 'y')
 
   # Enum values for edge orientations.
   HORZ = 0
@@ -31,7 +37,9 @@ class Edge:
     return hash(self.__repr__())
 
 
-class Point:
+class Point(object):
+
+  __slots__ = ('x', 'y')
 
   TAKEN = 'TAKEN'
 
@@ -55,6 +63,171 @@ class Point:
     return hash(self.__repr__())
 
 
+class Grid(object):
+
+  # Number of grid sizes whose tables are kept around.
+  CACHE_SIZE = 8
+
+  _cache = collections.OrderedDict()
+
+  # Returns the (shared) grid for mazes of the given size.
+  @staticmethod
+  def of_size(width, height):
+    key = (width, height)
+    grid = Grid._cache.pop(key, None)
+    if grid is None:
+      grid = Grid(width, height)
+      while len(Grid._cache) >= Grid.CACHE_SIZE:
+        Grid._cache.popitem(last=False)
+    Grid._cache[key] = grid
+    return grid
+
+  # Integer ids and adjacency tables for the edges and points of a grid.
+  # Edge ids index the HORZ block followed by the VERT block, row by row, and
+  # point ids are y * (width + 1) + x.
+  def __init__(self, width, height):
+    self.width = width
+    self.height = height
+    self.edge_size = [(width, height + 1), (width + 1, height)]
+    self.edge_offset = [0, width * (height + 1)]
+    self.num_edges = 2 * width * height + width + height
+    self.num_points = (width + 1) * (height + 1)
+
+  # The adjacency tables are only built when they're first used, so that
+  # mazes that are just loaded and drawn don't pay for them.
+  def __getattr__(self, name):
+    if name not in ('edge_points', 'point_edges'):
+      raise AttributeError(name)
+    self._build_tables()
+    return self.__dict__[name]
+
+  def _build_tables(self):
+    width = self.width
+    height = self.height
+    horz = np.arange(
+        self.edge_offset[Edge.VERT], dtype=np.int32).reshape(height + 1, width)
+    vert = np.arange(
+        self.edge_offset[Edge.VERT], self.num_edges,
+        dtype=np.int32).reshape(height, width + 1)
+    point = np.arange(
+        self.num_points, dtype=np.int32).reshape(height + 1, width + 1)
+
+    # Both end points of each edge at [2 * edge] (bottom / left) and
+    # [2 * edge + 1] (top / right).
+    edge_points = np.empty((self.num_edges, 2), dtype=np.int32)
+    edge_points[horz, 0] = point[:, :-1]
+    edge_points[horz, 1] = point[:, 1:]
+    edge_points[vert, 0] = point[:-1, :]
+    edge_points[vert, 1] = point[1:, :]
+    self.edge_points = edge_points.ravel()
+
+    # The edges touching each point at [4 * point + i], in west, east, south,
+    # north order, with -1 where the edge would be off the grid.
+    point_edges = np.full((height + 1, width + 1, 4), -1, dtype=np.int32)
+    point_edges[:, 1:, 0] = horz
+    point_edges[:, :-1, 1] = horz
+    point_edges[1:, :, 2] = vert
+    point_edges[:-1, :, 3] = vert
+    self.point_edges = point_edges.ravel()
+
+
+class PotentialEdges(object):
+
+  # The potential edges of a single wall, as an indexed set supporting O(1)
+  # add, remove and random choice. The edges are kept in a growable int32
+  # array, and where each edge is in it in positions, an int32 array indexed
+  # by edge id that all the walls of a maze share (an edge is only ever a
+  # potential edge of one wall, see Maze._point_wall).
+  #
+  # Each edge is added with a tag (the wall size when it was added), and only
+  # the most recent tag is ever chosen from, so the edges with that tag are
+  # also kept in a list of their own. That's only the few edges added by the
+  # last step of the wall.
+  def __init__(self, positions):
+    self.positions = positions
+    self.edges = np.empty(4, dtype=np.int32)
+    self.size = 0
+    self.latest_tag = None
+    self.latest_edges = []
+
+  # Returns the potential edges for an array of edges. They're not tagged,
+  # so they're only chosen from with choose(), which for a wall with no
+  # newer edges picks the same as choose_tagged() would.
+  @staticmethod
+  def of_edges(positions, edges):
+    pe = PotentialEdges(positions)
+    pe.edges = np.array(edges, dtype=np.int32)
+    pe.size = len(edges)
+    positions[pe.edges] = np.arange(pe.size, dtype=np.int32)
+    return pe
+
+  # Returns an independent copy using positions, which must be a copy of the
+  # positions this was made with.
+  def copy(self, positions):
+    pe = PotentialEdges(positions)
+    pe.edges = self.edges[:max(self.size, 1)].copy()
+    pe.size = self.size
+    pe.latest_tag = self.latest_tag
+    pe.latest_edges = list(self.latest_edges)
+    return pe
+
+  def __len__(self):
+    return self.size
+
+  def __iter__(self):
+    return iter(self.edges[:self.size].tolist())
+
+  def __contains__(self, e):
+    i = self.positions.item(e)
+    return 0 <= i < self.size and self.edges.item(i) == e
+
+  def __delitem__(self, e):
+    self.remove(e)
+
+  # Adds an edge that isn't a potential edge of any wall yet.
+  def add(self, e, tag):
+    if self.size == len(self.edges):
+      self.edges = np.resize(self.edges, 2 * len(self.edges))
+    self.edges[self.size] = e
+    self.positions[e] = self.size
+    self.size += 1
+
+    if tag != self.latest_tag:
+      self.latest_tag = tag
+      self.latest_edges = []
+    self.latest_edges.append(e)
+
+  def remove(self, e):
+    # Swap the last entry into the removed slot.
+    i = self.positions.item(e)
+    self.positions[e] = -1
+    self.size -= 1
+    last_e = self.edges.item(self.size)
+    if i < self.size:
+      self.edges[i] = last_e
+      self.positions[last_e] = i
+
+    if e not in self.latest_edges:
+      return
+    i = self.latest_edges.index(e)
+    last_e = self.latest_edges.pop()
+    if i < len(self.latest_edges):
+      self.latest_edges[i] = last_e
+
+  # Returns a random potential edge, or -1 if there are none.
+  def choose(self):
+    if not self.size:
+      return -1
+    return self.edges.item(random.randrange(self.size))
+
+  # Returns a random potential edge with the given tag, or -1 if there are
+  # none.
+  def choose_tagged(self, tag):
+    if tag != self.latest_tag or not self.latest_edges:
+      return -1
+    return self.latest_edges[random.randrange(len(self.latest_edges))]
+
+
 class Maze:
 
   BOTTOM_LEFT_H = 'BOTTOM_LEFT_H'
@@ -75,14 +248,39 @@ class Maze:
   RESERVED = -2
   PAINTED = -3
 
-  def __init__(self, width, height):
+  # Bit flags for point states. The low four bits mark which of the incident
+  # edges (west, east, south, north) have a potential claim on the point.
+  _POINT_CLAIMS = 0x0f
+  _POINT_TAKEN = 0x10
+
+  # If edges is given, it's used as the edge state array (e.g. a memory map)
+  # instead of allocating a new one.
+  def __init__(self, width, height, edges=None):
     self.width = width
     self.height = height
-    self.edges = (2 * width * height + width + height) * [Maze.EMPTY]
-    self.edge_size = [(width, height + 1), (width + 1, height)]
-    self.edge_offset = [0, width * (height + 1)]
-    self.points = ((width+1) * (height+1)) * [None]
+    # The exits left in the border by create_border, and the parameters the
+    # maze was generated with, which are stored along with it by mazefile.
+    self.exits = []
+    self.params = {}
+    self.grid = Grid.of_size(width, height)
+    self.edge_size = self.grid.edge_size
+    self.edge_offset = self.grid.edge_offset
+    # All edge states live in a single flat int32 array indexed by edge id,
+    # with a 2D [y, x] view for each of the HORZ and VERT blocks.
+    if edges is None:
+      edges = np.full(self.grid.num_edges, Maze.EMPTY, dtype=np.int32)
+    self.edges = edges
+    self.edge_blocks = [
+        self.edges[:self.edge_offset[Edge.VERT]].reshape(height + 1, width),
+        self.edges[self.edge_offset[Edge.VERT]:].reshape(height, width + 1),
+    ]
+    # The point state (see _POINT_CLAIMS and _POINT_TAKEN) and the positions
+    # of the potential edges (see PotentialEdges) are only allocated when
+    # they're first used (see __getattr__).
+    # Per wall, the PotentialEdges that wall could grow into.
     self.potential_edge_points = []
+    # The points taken by walls that have no edges yet, to their walls.
+    self.wall_starts = {}
     self.wall_size = []
     self.border_edges = {
         'BOTTOM_LEFT_H'  : Edge(Edge.HORZ,         0,          0),
@@ -99,23 +297,95 @@ class Maze:
         'TOP_RIGHT_V'    : Edge(Edge.VERT,     width, height - 1),
     }
 
-  def get_edge(self, edge):
-    return self.edges[
+  # Allocates points and potential_positions on first use, so that mazes
+  # that are just loaded and drawn, solved or analyzed only hold their edges.
+  def __getattr__(self, name):
+    if name == 'points':
+      self.points = np.zeros(self.grid.num_points, dtype=np.uint8)
+    elif name == 'potential_positions':
+      self.potential_positions = np.full(
+          self.grid.num_edges, -1, dtype=np.int32)
+    else:
+      raise AttributeError(name)
+    return self.__dict__[name]
+
+  def _edge_index(self, edge):
+    return (
         self.edge_offset[edge.ori]
         + edge.y * self.edge_size[edge.ori][0]
-        + edge.x]
+        + edge.x)
+
+  def _point_index(self, point):
+    return point.y * (self.width + 1) + point.x
+
+  def _edge_from_index(self, e):
+    ori = Edge.HORZ if e < self.edge_offset[Edge.VERT] else Edge.VERT
+    y, x = divmod(int(e) - self.edge_offset[ori], self.edge_size[ori][0])
+    return Edge(ori, x, y)
+
+  def _point_from_index(self, p):
+    y, x = divmod(int(p), self.width + 1)
+    return Point(x, y)
+
+  # Returns the bit used to mark a claim on point p by the incident edge e.
+  def _claim_bit(self, e, p):
+    if p == self.grid.edge_points.item(2 * e):
+      return 2 if e < self.edge_offset[Edge.VERT] else 8
+    return 1 if e < self.edge_offset[Edge.VERT] else 4
+
+  # Returns the wall that took point p: the wall of the edges it's on, or for
+  # a wall that hasn't grown from its first point yet, its wall_starts entry.
+  # Only that wall can have potential edges from p.
+  def _point_wall(self, p):
+    point_edges = self.grid.point_edges.item
+    for i in xrange(4 * p, 4 * p + 4):
+      e = point_edges(i)
+      if e >= 0:
+        v = self.edges.item(e)
+        if v >= 0:
+          return v
+    return self.wall_starts[p]
+
+  # Returns the other end of edge e from point p.
+  def _other_point(self, e, p):
+    edge_points = self.grid.edge_points.item
+    return edge_points(2 * e) + edge_points(2 * e + 1) - p
+
+  def get_edge(self, edge):
+    return self.edges[self._edge_index(edge)]
 
   def set_edge(self, edge, v):
-    self.edges[
-        self.edge_offset[edge.ori]
-        + edge.y * self.edge_size[edge.ori][0]
-        + edge.x] = v
+    self.edges[self._edge_index(edge)] = v
 
+  # Returns None for an unclaimed point, Point.TAKEN for a taken point, or the
+  # set of (wall, edge) potential claims on the point.
   def get_point(self, point):
-    return self.points[point.y * self.width + point.x]
-
+    p = self._point_index(point)
+    point_value = self.points[p]
+    if point_value & Maze._POINT_TAKEN:
+      return Point.TAKEN
+    if not point_value:
+      return None
+    claims = set()
+    for i in xrange(0, 4):
+      if point_value & (1 << i):
+        e = self.grid.point_edges.item(4 * p + i)
+        claims.add((
+            self._point_wall(self._other_point(e, p)),
+            self._edge_from_index(e)))
+    return claims
+
+  # Sets the state of a point as returned by get_point. The wall of a claim
+  # is always the wall that took the other end of its edge, so only the
+  # edges of the claims are used.
   def set_point(self, point, v):
-    self.points[point.y * self.width + point.x] = v
+    p = self._point_index(point)
+    self._clear_claims(p)
+    if v == Point.TAKEN:
+      self.points[p] = Maze._POINT_TAKEN
+    elif v:
+      for wall, edge in v:
+        self.points[p] |= self._claim_bit(self._edge_index(edge), p)
 
   # Iterates around the border of the maze.
   # Yields 4-tuple of:
@@ -181,25 +451,66 @@ class Maze:
     return random.sample(potential_edges, num_exits)
 
   def add_potential(self, wall, edge, pnt):
-    point_info = self.get_point(pnt)
+    self._add_potential(wall, self._edge_index(edge), self._point_index(pnt))
+
+  # The hot loops below read array elements with item() so that they do
+  # arithmetic on plain ints rather than NumPy scalars.
+  def _add_potential(self, wall, e, p):
     # Check to see if the point has been claimed.
-    if point_info == Point.TAKEN:
+    point_value = self.points.item(p)
+    if point_value & Maze._POINT_TAKEN:
       return
     # Check to see if the edge is empty
-    if self.get_edge(edge) != Maze.EMPTY:
+    if self.edges.item(e) != Maze.EMPTY:
       return
 
-    if point_info is None:
-      point_info = set()
-    point_info.add((wall, edge))
-    self.set_point(pnt, point_info)
-
-    if self.potential_edge_points[wall] is None:
-      self.potential_edge_points[wall] = {}
-    self.potential_edge_points[wall][edge] = (pnt, self.wall_size[wall])
+    # The edge can't be claimed by another wall already: its other end was
+    # only just taken by this wall, and any claims on it were cleared then.
+    self.points[p] = point_value | self._claim_bit(e, p)
+    self.potential_edge_points[wall].add(e, self.wall_size[wall])
+
+  # Builds a maze from a template with odd dimensions (2*n + 1) in which
+  # every other pixel is an edge, with the top row of the template at the top
+  # of the maze. The template can be a PIL image or an array of RGBA pixels,
+  # where transparent pixels are left empty and opaque ones are filled if
+  # they're dark red, painted if they're dark green and reserved otherwise.
+  # It can also be a 2D array: a bool mask of the edges to fill, or ints that
+  # are used as the edge states as they are.
+  @staticmethod
+  def from_template(template):
+    if isinstance(template, Image.Image) and template.mode != 'RGBA':
+      template = template.convert('RGBA')
+    template = np.asarray(template)
+    image_height, image_width = template.shape[0:2]
+    if image_width % 2 != 1 or image_height % 2 != 1:
+      raise ValueError(
+          'Maze template must have odd sized dimensions (2*n + 1)')
+    if template.ndim == 3 and template.shape[2] not in [3, 4]:
+      raise ValueError('Maze template pixels must be RGB or RGBA')
+    if template.ndim not in [2, 3]:
+      raise ValueError('Maze template must be an image, mask or state array')
+
+    maze = Maze(image_width / 2, image_height / 2)
+    # Flip the template so that its rows go up with y like the edge blocks.
+    template = template[::-1]
+    for ori, pixels in [
+        (Edge.HORZ, template[0::2, 1::2]), (Edge.VERT, template[1::2, 0::2])]:
+      block = maze.edge_blocks[ori]
+      if pixels.ndim == 3:
+        block[:] = Maze.RESERVED
+        block[pixels[:, :, 1] < 128] = Maze.PAINTED
+        block[pixels[:, :, 0] < 128] = 0
+        if pixels.shape[2] == 4:
+          block[pixels[:, :, 3] < 128] = Maze.EMPTY
+      elif pixels.dtype == bool:
+        block[:] = np.where(pixels, 0, Maze.EMPTY)
+      else:
+        block[:] = pixels
+    return maze
 
   def create_border(self, exits=None):
-    exit_set = set(exits or [])
+    self.exits = list(exits or [])
+    exit_set = set(self.exits)
     for border, pnt, perp, perp_pnt in self.border_iter():
       if border not in exit_set:
         self.set_edge(border, 0)
@@ -213,55 +524,81 @@ class Maze:
   def paint_edge(self, edge):
     self.set_edge(edge, Maze.PAINTED)
 
-  def _discover_wall_from_edge(self, edge, wall, processed_edges):
-    temp_wall_size = 0
-    neighbors_to_check = [edge]
-    processed_edges.add(edge)
-    while neighbors_to_check:
-      edge = neighbors_to_check.pop()
-      self.set_edge(edge, wall)
-      temp_wall_size += 1
-
-      # Claim both ends of this edge
-      for neighbor_pnt in self.edge_points(edge):
-        self.take_point(neighbor_pnt)
-
-      # Check all neighbors of this edge to see if we need to process them.
-      for neighbor_edge, neighbor_pnt in self.neighbors_of_edge(edge):
-        if neighbor_edge in processed_edges:
-          continue
-        processed_edges.add(neighbor_edge)
-        neighbor_value = self.get_edge(neighbor_edge)
-        if neighbor_value == Maze.EMPTY:
-          self.add_potential(wall, neighbor_edge, neighbor_pnt)
-        elif neighbor_value >= 0:
-          neighbors_to_check.append(neighbor_edge)
-
-    self.wall_size[wall] = temp_wall_size
-
   def all_edges(self):
     for ori in [Edge.HORZ, Edge.VERT]:
       for x in xrange(0, self.edge_size[ori][0]):
         for y in xrange(0, self.edge_size[ori][1]):
           yield Edge(ori, x, y)
 
+  # Labels the walls made by the filled edges and rebuilds the point states
+  # and potential edges from scratch. Walls are numbered in the order their
+  # first edge appears in all_edges(), and each wall can grow into every empty
+  # edge with exactly one end on it.
   def initialize_state_from_edges(self):
-    # Reset things to make this method re-callable
-    self.wall_size = []
-
-    processed_edges = set()
-    for edge in self.all_edges():
-      if edge in processed_edges:
-        continue
-      edge_value = self.get_edge(edge)
-      if edge_value < 0:
-        continue
-
-      # At this point we've discovered part of a new wall
-      wall = len(self.wall_size)
-      self.wall_size.append(0)
-      self.potential_edge_points.append(None)
-      self._discover_wall_from_edge(edge, wall, processed_edges)
+    edge_points = self.grid.edge_points.reshape(-1, 2)
+    # The filled edges in the same order as all_edges(), column by column.
+    filled = np.concatenate([
+        (self.edge_offset[ori] + y * self.edge_size[ori][0] + x).astype(
+            np.int32)
+        for ori in [Edge.HORZ, Edge.VERT]
+        for x, y in [np.nonzero(self.edge_blocks[ori].T >= 0)]])
+    ends = edge_points[filled]
+    roots = unionfind.label_components(
+        self.grid.num_points, ends[:, 0], ends[:, 1])
+
+    # Number the walls by their first edge.
+    edge_roots = roots[ends[:, 0]]
+    unique_roots, first = np.unique(edge_roots, return_index=True)
+    unique_roots = unique_roots[np.argsort(first)]
+    point_walls = np.full(self.grid.num_points, -1, dtype=np.int32)
+    point_walls[unique_roots] = np.arange(len(unique_roots), dtype=np.int32)
+    edge_walls = point_walls[edge_roots]
+    self.edges[filled] = edge_walls
+    self.wall_size = np.bincount(
+        edge_walls, minlength=len(unique_roots)).tolist()
+
+    self.points = np.zeros(self.grid.num_points, dtype=np.uint8)
+    self.points[ends.ravel()] = Maze._POINT_TAKEN
+    self.wall_starts = {}
+    # Free the per filled edge arrays before listing the frontier.
+    del filled, ends, edge_roots, edge_walls
+
+    # Empty edges leading from a wall to a point that isn't taken yet, found
+    # block by block so that only those edges get listed.
+    taken = (self.points != 0).reshape(self.height + 1, self.width + 1)
+    empty = []
+    from_start = []
+    for ori, taken_start, taken_end in [
+        (Edge.HORZ, taken[:, :-1], taken[:, 1:]),
+        (Edge.VERT, taken[:-1, :], taken[1:, :])]:
+      frontier = (self.edge_blocks[ori] == Maze.EMPTY) & (
+          taken_start != taken_end)
+      ids = np.nonzero(frontier.ravel())[0].astype(np.int32)
+      empty.append(self.edge_offset[ori] + ids)
+      from_start.append(taken_start.ravel()[ids])
+    empty = np.concatenate(empty)
+    from_start = np.concatenate(from_start)
+    empty_ends = edge_points[empty]
+    wall_points = np.where(from_start, empty_ends[:, 0], empty_ends[:, 1])
+    claimed_points = np.where(from_start, empty_ends[:, 1], empty_ends[:, 0])
+    walls = point_walls[roots[wall_points]]
+    # Same as _claim_bit(): an edge claiming its start point is the east or
+    # north edge of that point.
+    horz = empty < self.edge_offset[Edge.VERT]
+    bits = np.where(
+        from_start, np.where(horz, 1, 4), np.where(horz, 2, 8))
+    np.bitwise_or.at(self.points, claimed_points, bits.astype(np.uint8))
+
+    by_wall = np.lexsort((empty, walls))
+    empty = empty[by_wall]
+    bounds = np.searchsorted(
+        walls[by_wall], np.arange(len(self.wall_size) + 1)).tolist()
+    self.potential_positions = np.full(
+        self.grid.num_edges, -1, dtype=np.int32)
+    self.potential_edge_points = [
+        PotentialEdges.of_edges(
+            self.potential_positions, empty[bounds[wall]:bounds[wall + 1]])
+        for wall in xrange(0, len(self.wall_size))]
 
     # Do an iteration around the border to detect double-wide gaps and
     # insert a potential edge with a new wall in between.
@@ -291,68 +628,165 @@ class Maze:
 
       wall = len(self.wall_size)
       self.wall_size.append(0)
-      self.potential_edge_points.append(None)
+      self.potential_edge_points.append(
+          PotentialEdges(self.potential_positions))
       self.take_point(last_pnt)
+      self.wall_starts[self._point_index(last_pnt)] = wall
       self.add_potential(wall, last_perp, last_perp_pnt)
 
-  def generate_all_walls(self, same_branch_probability):
-    for step in self.generate_each_wall(same_branch_probability):
+  # Fills in the maze with an engine from the engines module, by default
+  # engines.WallGrowingEngine, which is the same as generate_all_walls.
+  def generate(self, engine=None):
+    # Imported here since engines imports this module.
+    import engines
+    if engine is None:
+      engine = engines.WallGrowingEngine()
+    engine.generate(self)
+
+  def generate_all_walls(
+      self, same_branch_probability, observer=None, initialize=True):
+    for step in self.generate_each_wall(
+        same_branch_probability, observer, initialize=initialize):
       pass
 
-  def generate_each_wall(self, same_branch_probability):
-    self.initialize_state_from_edges()
-
-    step = 0
-    yield step
-    step += 1
-
-    more_to_do = True
-    while more_to_do:
-      more_to_do = False
-      for i in xrange(0, self.num_walls()):
-        did_something = self.grow_wall(i, same_branch_probability)
-        more_to_do = more_to_do or did_something
-      yield step
+  # If an observer (see stats.GenerationObserver) is given, it's told when
+  # generation starts, after every round, and when generation finishes. The
+  # generation loop itself doesn't change, so there's no cost without one.
+  #
+  # If report_changes is set, (step, changed) is yielded instead of step,
+  # where changed is an array of the ids of the edges filled in that step
+  # (every filled edge for step 0).
+  #
+  # With initialize=False, the walls and potential edges are used as they
+  # are instead of being rebuilt from the edges, e.g. for a maze forked from
+  # a MazeSnapshot.
+  def generate_each_wall(
+      self, same_branch_probability, observer=None, report_changes=False,
+      initialize=True):
+    self.params['same_branch_probability'] = same_branch_probability
+    if observer is not None:
+      observer.start(self)
+    try:
+      if initialize:
+        self.initialize_state_from_edges()
+
+      step = 0
+      if observer is not None:
+        observer.round(self, step)
+      if report_changes:
+        yield step, np.nonzero(self.edges >= 0)[0].astype(np.int32)
+      else:
+        yield step
       step += 1
 
+      changed = [] if report_changes else None
+      more_to_do = True
+      while more_to_do:
+        more_to_do = False
+        for i in xrange(0, self.num_walls()):
+          new_e = self._grow_wall(i, same_branch_probability)
+          if new_e >= 0:
+            more_to_do = True
+            if changed is not None:
+              changed.append(new_e)
+        if observer is not None:
+          observer.round(self, step)
+        if report_changes:
+          yield step, np.array(changed, dtype=np.int32)
+          changed = []
+        else:
+          yield step
+        step += 1
+    finally:
+      if observer is not None:
+        observer.finish(self)
+
   def num_walls(self):
     return len(self.wall_size)
 
+  # Returns a MazeSnapshot of the maze as it is now, normally taken right
+  # after initialize_state_from_edges.
+  def snapshot(self):
+    return MazeSnapshot(self)
+
+  # Returns the approximate number of bytes used by the edge and point state
+  # of this maze, by structure. The grid tables are shared by all mazes of the
+  # same size.
+  def memory_usage(self):
+    potential_edges = sys.getsizeof(self.potential_edge_points)
+    if 'potential_positions' in self.__dict__:
+      potential_edges += self.potential_positions.nbytes
+    for pe in self.potential_edge_points:
+      potential_edges += sum(sys.getsizeof(v) for v in [
+          pe, pe.edges, pe.latest_edges])
+    usage = {
+        'edges': self.edges.nbytes,
+        'points': self.points.nbytes if 'points' in self.__dict__ else 0,
+        'grid': self.grid.edge_points.nbytes + self.grid.point_edges.nbytes,
+        'potential_edges': potential_edges,
+        'wall_size': sys.getsizeof(self.wall_size),
+    }
+    usage['total'] = sum(usage.values())
+    return usage
+
+  # Removes all potential claims on point p.
+  def _clear_claims(self, p):
+    point_value = self.points.item(p)
+    if not point_value & Maze._POINT_CLAIMS:
+      return
+    edge_points = self.grid.edge_points.item
+    point_edges = self.grid.point_edges.item
+    for i in xrange(0, 4):
+      if point_value & (1 << i):
+        e = point_edges(4 * p + i)
+        other = edge_points(2 * e) + edge_points(2 * e + 1) - p
+        self.potential_edge_points[self._point_wall(other)].remove(e)
+    self.points[p] = point_value & Maze._POINT_TAKEN
+
   def take_point(self, point):
-    point_value = self.get_point(point)
+    self._take_point(self._point_index(point))
+
+  def _take_point(self, p):
     # Clear any potential claims to this point.
-    if point_value is not None and isinstance(point_value, set):
-      for neighbor_wall, neighbor_edge in point_value:
-        del self.potential_edge_points[neighbor_wall][neighbor_edge]
+    self._clear_claims(p)
     # Claim the point
-    self.set_point(point, Point.TAKEN)
+    self.points[p] = Maze._POINT_TAKEN
 
   def grow_wall(self, wall, same_branch_probability=0.0):
+    return self._grow_wall(wall, same_branch_probability) >= 0
+
+  # Grows a wall by one edge, returning the new edge or -1 if it can't grow.
+  def _grow_wall(self, wall, same_branch_probability):
+    pep = self.potential_edge_points[wall]
+    if not pep:
+      return -1
     # First check to see if we have a potential extension from the most recent
     # tag.
-    edge_population = set()
-    pep = self.potential_edge_points[wall]
+    new_e = -1
     if same_branch_probability > random.random():
-      tag = self.wall_size[wall]
-      for edge in pep:
-        if pep[edge][1] == tag:
-          edge_population.add(edge)
+      new_e = pep.choose_tagged(self.wall_size[wall])
     # If we either skipped trying to use the most recent tag, or there weren't
     # any potential edges with that tag, fallback on the set of all potential
     # edges.
-    if not edge_population:
-      edge_population = set(pep.keys())
-    if len(edge_population) == 0:
-      return False
-    new_edge = random.sample(edge_population, 1)[0]
-    self.set_edge(new_edge, wall)
+    if new_e < 0:
+      new_e = pep.choose()
+    self.edges[new_e] = wall
     self.wall_size[wall] += 1
-    pnt = pep[new_edge][0]
-    self.take_point(pnt)
+    # The new point is the end of the edge that isn't taken yet.
+    edge_points = self.grid.edge_points.item
+    point_edges = self.grid.point_edges.item
+    p = edge_points(2 * new_e)
+    if self.points.item(p) & Maze._POINT_TAKEN:
+      p = edge_points(2 * new_e + 1)
+    self._take_point(p)
     # Add all new potential edges for this wall.
-    for neighbor_edge, neighbor_pnt in self.neighbors_of_point(pnt):
-      self.add_potential(wall, neighbor_edge, neighbor_pnt)
-    return True
+    for i in xrange(4 * p, 4 * p + 4):
+      neighbor_e = point_edges(i)
+      if neighbor_e >= 0:
+        neighbor_p = (
+            edge_points(2 * neighbor_e) + edge_points(2 * neighbor_e + 1) - p)
+        self._add_potential(wall, neighbor_e, neighbor_p)
+    return new_e
 
   def print_maze(self):
     for y in xrange(self.height, -1, -1):
@@ -365,49 +799,185 @@ class Maze:
           print ('% 4d' % self.get_edge(Edge(Edge.VERT, x, y-1))),
         print ''
 
-  def create_canvas(self, pixels_per_square, color_list):
-    canvas = Canvas(
-        width = self.width * pixels_per_square + 1,
-        height = self.height * pixels_per_square + 1)
-    scale = pixels_per_square
-
-    p0 = np.matrix([0, 0])
-    p1 = np.matrix([0, 0])
-
-    for x in xrange(0, self.width):
-      p0[0, 0] = x * scale
-      p1[0, 0] = (x + 1) * scale
-
-      for y in xrange(0, self.height + 1):
-        edge = self.get_edge(Edge(Edge.HORZ, x, y))
-        if edge < 0 and edge != Maze.PAINTED:
-          continue
-
-        p0[0, 1] = y * scale
-        p1[0, 1] = y * scale
-
-        color = (Canvas.COLORS['BLACK']
-            if edge == Maze.PAINTED else color_list[edge])
-        canvas.draw_line(p0, p1, color)
-
-    for x in xrange(0, self.width + 1):
-      p0[0, 0] = x * scale
-      p1[0, 0] = x * scale
-
-      for y in xrange(0, self.height):
-        edge = self.get_edge(Edge(Edge.VERT, x, y))
-        if edge < 0 and edge != Maze.PAINTED:
-          continue
-
-        p0[0, 1] = y * scale
-        p1[0, 1] = (y + 1) * scale
-
-        color = (Canvas.COLORS['BLACK']
-            if edge == Maze.PAINTED else color_list[edge])
-        canvas.draw_line(p0, p1, color)
-
+  # Returns a mask of the edge states that get drawn.
+  @staticmethod
+  def _drawn(states):
+    return (states >= 0) | (states == Maze.PAINTED)
+
+  # Rasterizes the lines of one orientation. block holds the [line, edge]
+  # states, and edge i of every line runs from pixel starts[i] to pixel
+  # starts[i + 1] plus the line width. Where consecutive edges overlap, the
+  # later one wins if later_wins and it's drawn, and the earlier one wins
+  # otherwise. Returns the first pixel and the [line, pixel] states.
+  @staticmethod
+  def _rasterize_lines(block, starts, line_width, later_wins):
+    num_edges = block.shape[1]
+    pixels = np.arange(starts[0], starts[-1] + line_width)
+    edge_of_pixel = np.clip(
+        np.searchsorted(starts, pixels, side='right') - 1, 0, num_edges - 1)
+    lines = block[:, edge_of_pixel]
+
+    shared = (
+        (edge_of_pixel > 0) & (pixels < starts[edge_of_pixel] + line_width))
+    later = lines[:, shared]
+    earlier = block[:, edge_of_pixel[shared] - 1]
+    if later_wins:
+      lines[:, shared] = np.where(Maze._drawn(later), later, earlier)
+    else:
+      lines[:, shared] = np.where(Maze._drawn(earlier), earlier, later)
+    return starts[0], lines
+
+  # Writes the drawn pixels of lines into image[rows, cols] as IndexCanvas
+  # values.
+  @staticmethod
+  def _paint_lines(image, rows, cols, lines, index):
+    values = np.where(
+        lines == Maze.PAINTED, IndexCanvas.BLACK,
+        lines if index is None else index)
+    image[rows, cols] = np.where(
+        Maze._drawn(lines), values, image[rows, cols])
+
+  # Draws the maze into an IndexCanvas with its top left corner at pos. Grid
+  # lines are pixels_per_square apart (which needn't be a whole number) and
+  # line_width pixels wide. Walls are drawn with their wall id, or with index
+  # if it's given, and painted edges are drawn BLACK. Overlapping pixels come
+  # out as if every HORZ edge and then every VERT edge had been drawn in
+  # all_edges() order.
+  def draw(self, canvas, pos, pixels_per_square, line_width=1, index=None):
+    if line_width > int(pixels_per_square):
+      raise ValueError('Lines can be at most one square wide')
+    image = canvas.image_data
+    # Pixel offsets of every grid line, indexed by x and y.
+    cols = pos[0] + np.rint(
+        np.arange(0, self.width + 1) * pixels_per_square).astype(int)
+    rows = pos[1] + np.rint(
+        np.arange(self.height, -1, -1) * pixels_per_square).astype(int)
+
+    first, lines = Maze._rasterize_lines(
+        self.edge_blocks[Edge.HORZ], cols, line_width, True)
+    pixels = slice(first, first + lines.shape[1])
+    for offset in xrange(0, line_width):
+      Maze._paint_lines(
+          image, rows + offset, pixels, lines, index)
+
+    # VERT edges are drawn bottom to top, so going down the image the edge
+    # above wins where two of them overlap.
+    first, lines = Maze._rasterize_lines(
+        self.edge_blocks[Edge.VERT][::-1].T, rows[::-1], line_width, False)
+    pixels = slice(first, first + lines.shape[1])
+    for offset in xrange(0, line_width):
+      Maze._paint_lines(
+          image, pixels, cols + offset, lines.T, index)
+
+  # Returns (pos, pixels_per_square, line_width) for drawing the maze as
+  # large as it fits, centered in box = (x, y, width, height). line_width
+  # defaults to a quarter of a square.
+  def layout_in_box(self, box, line_width=None):
+    x, y, width, height = box
+    if line_width is None:
+      pixels_per_square = min(
+          float(width) / self.width, float(height) / self.height)
+      line_width = max(1, int(pixels_per_square / 4))
+    pixels_per_square = min(
+        float(width - line_width) / self.width,
+        float(height - line_width) / self.height)
+    draw_width = int(round(self.width * pixels_per_square)) + line_width
+    draw_height = int(round(self.height * pixels_per_square)) + line_width
+    pos = (
+        int(x + (width - draw_width) / 2),
+        int(y + (height - draw_height) / 2))
+    return pos, pixels_per_square, line_width
+
+  # Draws the maze as laid out by layout_in_box in box of an IndexCanvas.
+  # Returns the pixels per square that were used.
+  def draw_in_box(self, canvas, box, line_width=None, index=None):
+    pos, pixels_per_square, line_width = self.layout_in_box(box, line_width)
+    self.draw(canvas, pos, pixels_per_square, line_width, index)
+    return pixels_per_square
+
+  # Returns an IndexCanvas just big enough for the maze, with the wall id of
+  # every wall pixel, BLACK for painted edges and EMPTY everywhere else.
+  def create_index_canvas(self, pixels_per_square, line_width=1):
+    canvas = IndexCanvas(
+        width = self.width * pixels_per_square + line_width,
+        height = self.height * pixels_per_square + line_width)
+    self.draw(canvas, (0, 0), pixels_per_square, line_width)
     return canvas
 
+  def create_canvas(self, pixels_per_square, color_list):
+    return self.create_index_canvas(pixels_per_square).get_canvas(color_list)
+
+  # Returns the longest straight runs of drawn edges in the same state, as an
+  # (N, 5) array of (x0, y0, x1, y1, state) rows in grid coordinates, with
+  # the HORZ runs first. If by_wall is False, every drawn edge counts as
+  # PAINTED, so runs go on across walls.
+  def wall_runs(self, by_wall=True):
+    runs = []
+    for ori in [Edge.HORZ, Edge.VERT]:
+      block = self.edge_blocks[ori]
+      states = np.where(
+          Maze._drawn(block), block if by_wall else Maze.PAINTED, Maze.EMPTY)
+      if ori == Edge.VERT:
+        # Runs go along y for VERT edges.
+        states = states.T
+      padded = np.full(
+          (states.shape[0], states.shape[1] + 2), Maze.EMPTY, dtype=np.int32)
+      padded[:, 1:-1] = states
+      changed = padded[:, 1:] != padded[:, :-1]
+      drawn = states != Maze.EMPTY
+      line, first = np.nonzero(changed[:, :-1] & drawn)
+      last = np.nonzero(changed[:, 1:] & drawn)[1]
+      ori_runs = np.empty((len(line), 5), dtype=np.int32)
+      if ori == Edge.HORZ:
+        ori_runs[:, 0:4] = np.column_stack((first, line, last + 1, line))
+      else:
+        ori_runs[:, 0:4] = np.column_stack((line, first, line, last + 1))
+      ori_runs[:, 4] = states[line, first]
+      runs.append(ori_runs)
+    return np.concatenate(runs)
+
+  # Returns the walls as a list of (state, points) polylines, where points is
+  # an (N, 2) array of grid coordinates, by chaining together the wall_runs
+  # in the same state that meet end to end. Polylines end where a wall
+  # branches, so every run is in exactly one of them.
+  def wall_polylines(self, by_wall=True):
+    runs = self.wall_runs(by_wall).tolist()
+    # (state, x, y) -> indices of the runs ending there.
+    ends = {}
+    for i, (x0, y0, x1, y1, state) in enumerate(runs):
+      ends.setdefault((state, x0, y0), []).append(i)
+      ends.setdefault((state, x1, y1), []).append(i)
+    used = [False] * len(runs)
+
+    def follow(i, x, y):
+      state = runs[i][4]
+      points = [(x, y)]
+      while True:
+        used[i] = True
+        x0, y0, x1, y1 = runs[i][0:4]
+        x, y = (x1, y1) if (x0, y0) == (x, y) else (x0, y0)
+        points.append((x, y))
+        joined = ends[(state, x, y)]
+        if len(joined) != 2:
+          break
+        i = joined[0] if joined[1] == i else joined[1]
+        if used[i]:
+          break
+      return state, np.array(points, dtype=np.int32)
+
+    polylines = []
+    # Start from the ends and branch points, then pick up any loops.
+    for state, x, y in sorted(ends):
+      joined = ends[(state, x, y)]
+      if len(joined) != 2:
+        for i in joined:
+          if not used[i]:
+            polylines.append(follow(i, x, y))
+    for i, run in enumerate(runs):
+      if not used[i]:
+        polylines.append(follow(i, run[0], run[1]))
+    return polylines
+
   def check_neighbors(self, unchecked_generator):
     for t in unchecked_generator:
       edge = t
@@ -437,8 +1007,19 @@ class Maze:
       yield Edge(Edge.HORZ, edge.x,   edge.y+1), Point(edge.x+1, edge.y+1)
       yield Edge(Edge.HORZ, edge.x-1, edge.y+1), Point(edge.x-1, edge.y+1)
 
+  # Yields (neighbor edge, point at the far end of the neighbor edge).
   def neighbors_of_edge(self, edge):
-    return self.check_neighbors(self.unchecked_neighbors_of_edge(edge))
+    e = self._edge_index(edge)
+    edge_points = self.grid.edge_points
+    for p in edge_points[2 * e:2 * e + 2]:
+      for neighbor_e in self.grid.point_edges[4 * p:4 * p + 4]:
+        if neighbor_e < 0 or neighbor_e == e:
+          continue
+        yield (
+            self._edge_from_index(neighbor_e),
+            self._point_from_index(
+                edge_points[2 * neighbor_e]
+                + edge_points[2 * neighbor_e + 1] - p))
 
   def unchecked_neighbors_of_point(self, point):
     yield Edge(Edge.HORZ, point.x-1, point.y),   Point(point.x-1, point.y)
@@ -446,16 +1027,23 @@ class Maze:
     yield Edge(Edge.VERT, point.x,   point.y-1), Point(point.x,   point.y-1)
     yield Edge(Edge.VERT, point.x,   point.y),   Point(point.x,   point.y+1)
 
+  # Yields (neighbor edge, point at the far end of the neighbor edge).
   def neighbors_of_point(self, point):
-    return self.check_neighbors(self.unchecked_neighbors_of_point(point))
+    p = self._point_index(point)
+    edge_points = self.grid.edge_points
+    for neighbor_e in self.grid.point_edges[4 * p:4 * p + 4]:
+      if neighbor_e < 0:
+        continue
+      yield (
+          self._edge_from_index(neighbor_e),
+          self._point_from_index(
+              edge_points[2 * neighbor_e]
+              + edge_points[2 * neighbor_e + 1] - p))
 
   def edge_points(self, edge):
-    if edge.ori == Edge.HORZ:
-      yield Point(edge.x,   edge.y)
-      yield Point(edge.x+1, edge.y)
-    else:
-      yield Point(edge.x, edge.y)
-      yield Point(edge.x, edge.y+1)
+    e = self._edge_index(edge)
+    for p in self.grid.edge_points[2 * e:2 * e + 2]:
+      yield self._point_from_index(p)
 
   # Iterates south, north, west, east
   def square_edges(self, x, y):
@@ -463,3 +1051,46 @@ class Maze:
     yield Edge(Edge.HORZ, x, y+1)
     yield Edge(Edge.VERT, x, y)
     yield Edge(Edge.VERT, x+1, y)
+
+
+# A copy of the full generation state of a maze (edge states, point claims,
+# walls and their potential edges) that any number of mazes can be forked
+# from. Taking one after loading a template and initializing it means every
+# maze made from the template only has to do the growing, e.g.
+#
+#   maze = Maze.from_template(template)
+#   maze.initialize_state_from_edges()
+#   snapshot = maze.snapshot()
+#   for seed in seeds:
+#     random.seed(seed)
+#     maze = snapshot.fork()
+#     maze.generate_all_walls(1.0, initialize=False)
+class MazeSnapshot(object):
+
+  def __init__(self, maze):
+    self.width = maze.width
+    self.height = maze.height
+    self.exits = list(maze.exits)
+    self.params = dict(maze.params)
+    self.edges = np.array(maze.edges)
+    self.points = maze.points.copy()
+    self.wall_starts = dict(maze.wall_starts)
+    self.wall_size = list(maze.wall_size)
+    self.potential_positions = maze.potential_positions.copy()
+    self.potential_edge_points = [
+        pe.copy(self.potential_positions)
+        for pe in maze.potential_edge_points]
+
+  # Returns a new maze in the state the snapshot was taken in.
+  def fork(self):
+    maze = Maze(self.width, self.height, edges=self.edges.copy())
+    maze.exits = list(self.exits)
+    maze.params = dict(self.params)
+    maze.points = self.points.copy()
+    maze.wall_starts = dict(self.wall_starts)
+    maze.wall_size = list(self.wall_size)
+    maze.potential_positions = self.potential_positions.copy()
+    maze.potential_edge_points = [
+        pe.copy(maze.potential_positions)
+        for pe in self.potential_edge_points]
+    return maze
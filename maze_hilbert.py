@@ -7,7 +7,6 @@ from canvas import Canvas
 
 
 GRID_SIZE = 1024
-IMAGE_SIZE = GRID_SIZE + 1
 COLOR_LIST = [
   [255,   0,   0, 255], # 1024
   [255, 127,   0, 217], #  512
@@ -20,88 +19,99 @@ COLOR_LIST = [
   [  0,   0, 255,  31], #    4
 ]
 
-POINT_BUFFER = [
-  np.matrix([-0.5, 3. / 32., 1.]),
-  np.matrix([-0.5, -0.5, 1.]),
-  np.matrix([0.5, -0.5, 1.]),
-  np.matrix([0.5, 3. / 32., 1.]),
-  np.matrix([0.0, 0.0, 1.]),
-  np.matrix([0.0, 0.5, 1.]),
-]
-
-LINE_SEGMENTS = [
+# (x, y) points of the pattern drawn for every node of the curve.
+POINT_BUFFER = np.array([
+  [-0.5, 3. / 32.],
+  [-0.5, -0.5],
+  [0.5, -0.5],
+  [0.5, 3. / 32.],
+  [0.0, 0.0],
+  [0.0, 0.5],
+])
+
+LINE_SEGMENTS = np.array([
   [0, 1],
   [1, 2],
   [2, 3],
   [4, 5],
-]
+])
 
-HALF_SCALE_XFORM = xform.scale(0.5, 0.5)
+HALF_SCALE_XFORM = xform.HALF_SCALE_XFORM
 
-CHILD_XFORMS = [
+CHILD_XFORMS = xform.stack([
   # Top right
-  xform.rotate(clockwise=True) * xform.translate(0.5, 0.5) * HALF_SCALE_XFORM,
+  xform.compose(xform.CLOCKWISE_XFORM, xform.translate_array(0.5, 0.5),
+                HALF_SCALE_XFORM),
   # Top left
-  xform.rotate(clockwise=False) * xform.translate(-0.5, 0.5) * HALF_SCALE_XFORM,
+  xform.compose(xform.COUNTERCLOCKWISE_XFORM,
+                xform.translate_array(-0.5, 0.5), HALF_SCALE_XFORM),
   # Bottom right
-  xform.translate(0.5, -0.5) * HALF_SCALE_XFORM,
+  xform.compose(xform.translate_array(0.5, -0.5), HALF_SCALE_XFORM),
   # Bottom left
-  xform.translate(-0.5, -0.5) * HALF_SCALE_XFORM,
-]
-
-class DrawState:
-
-  def __init__(self, level, color_index, xfm):
-    self.level = level
-    self.color_index = color_index
-    self.xfm = xfm
-
-  def create_child_state(self, child_xform):
-    return DrawState(
-        self.level - 1,
-        self.color_index,
-        child_xform * self.xfm)
-
-  def draw_pattern(self, canvas):
-    for line_segment in LINE_SEGMENTS:
-      p0 = POINT_BUFFER[line_segment[0]] * self.xfm
-      p1 = POINT_BUFFER[line_segment[1]] * self.xfm
-      canvas.draw_line(
-          np.rint(p0).astype(int),
-          np.rint(p1).astype(int),
-          COLOR_LIST[self.color_index])
-
-
-
-
-canvas = Canvas(IMAGE_SIZE, IMAGE_SIZE)
-
-image_xform = (
-    xform.translate(0.5, 0.5)
-    * xform.scale(1. * GRID_SIZE, 1. * GRID_SIZE))
-
-# Populate the stack with all levels
-s = []
-size = GRID_SIZE
-color_index = 0
-level = 0
-while size >= 4:
-  s.append(DrawState(level, color_index, image_xform))
-  size = size / 2
-  level = level + 1
-  color_index = (color_index + 1) % len(COLOR_LIST)
-
-# Iterate until there's nothing left in the stack
-while s:
-  state = s.pop()
-
-  # If we're not at the correct level, push back all the children of this
-  # state and move on.
-  if state.level > 0:
-    for child_xform in CHILD_XFORMS:
-      s.append(state.create_child_state(child_xform))
-  else:
-    # Otherwise draw the current state
-    state.draw_pattern(canvas)
-
-canvas.save("images/maze_hilbert.png")
+  xform.compose(xform.translate_array(-0.5, -0.5), HALF_SCALE_XFORM),
+])
+
+# The child transforms in the order they're drawn in, which is last to first.
+DRAW_ORDER_XFORMS = CHILD_XFORMS[::-1]
+
+# Transforms are expanded at most this many levels at a time, which bounds
+# the memory used to 4**MAX_BATCH_LEVELS transforms.
+MAX_BATCH_LEVELS = 8
+
+
+# Yields batches of the (N, 3, 3) transforms of the patterns level levels
+# below the transform xfm, in drawing order: depth first, each node's
+# children in the reverse order of CHILD_XFORMS.
+def leaf_xforms(xfm, level):
+  if level > MAX_BATCH_LEVELS:
+    for child_xform in DRAW_ORDER_XFORMS:
+      for xfms in leaf_xforms(
+          xform.compose(child_xform, xfm), level - 1):
+        yield xfms
+    return
+  xfms = xfm[np.newaxis]
+  for _ in xrange(0, level):
+    xfms = xform.compose(
+        DRAW_ORDER_XFORMS, xfms[:, np.newaxis]).reshape(-1, 3, 3)
+  yield xfms
+
+
+# Draws the pattern transformed by every one of xfms.
+def draw_patterns(canvas, xfms, color):
+  points = np.rint(xform.apply(xfms, POINT_BUFFER)).astype(int)
+  segments = np.concatenate(
+      (points[:, LINE_SEGMENTS[:, 0]], points[:, LINE_SEGMENTS[:, 1]]),
+      axis=-1)
+  canvas.draw_lines(segments, color)
+
+
+# Draws the curve for a grid_size x grid_size grid (a power of 2) onto a new
+# canvas with one pixel per grid line.
+def draw_hilbert(grid_size):
+  canvas = Canvas(grid_size + 1, grid_size + 1)
+
+  image_xform = xform.compose(
+      xform.translate_array(0.5, 0.5),
+      xform.scale_array(1. * grid_size, 1. * grid_size))
+
+  # Each level is a copy of the curve at a different scale, drawn from the
+  # finest to the coarsest.
+  levels = []
+  size = grid_size
+  color_index = 0
+  level = 0
+  while size >= 4:
+    levels.append((level, color_index))
+    size = size / 2
+    level = level + 1
+    color_index = (color_index + 1) % len(COLOR_LIST)
+
+  for level, color_index in reversed(levels):
+    for xfms in leaf_xforms(image_xform, level):
+      draw_patterns(canvas, xfms, COLOR_LIST[color_index])
+
+  return canvas
+
+
+if __name__ == '__main__':
+  draw_hilbert(GRID_SIZE).save("images/maze_hilbert.png")
@@ -0,0 +1,18 @@
+#!/usr/bin/env python
+
+import sys
+from eller import EllerMaze
+from eller import write_png
+
+PIXELS_PER_SQUARE = 8
+LINE_WIDTH = 2
+
+# Generates a maze of any height straight into a black and white PNG, one row
+# at a time, e.g. a 40 x 100000 scroll.
+if __name__ == '__main__':
+  if len(sys.argv) < 4:
+    print 'Usage: %s width height output.png' % sys.argv[0]
+    exit(1)
+  maze = EllerMaze(int(sys.argv[1]), int(sys.argv[2]))
+  maze.exits = maze.choose_exits(2)
+  write_png(maze, sys.argv[3], PIXELS_PER_SQUARE, LINE_WIDTH)
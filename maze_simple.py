@@ -1,16 +1,16 @@
 #!/usr/bin/env python
 
-from PIL import Image
 from maze import Maze
 from maze import Point
 from maze import Edge
 from canvas import Canvas
+from canvas import IndexCanvas
+from vector import VectorPage
+import solver
 
 MAZE_WIDTH = 20
 MAZE_HEIGHT = 20
 
-PIXELS_PER_SQUARE = 4
-
 COLOR_LIST = Canvas.random_color_list()
 
 # Maximum percent of available space to occupy
@@ -21,29 +21,36 @@ maze = Maze(MAZE_WIDTH, MAZE_HEIGHT)
 exits = maze.choose_exits(2)
 maze.create_border(exits)
 maze.generate_all_walls(same_branch_probability=1.0)
-canvas = maze.create_canvas(PIXELS_PER_SQUARE, COLOR_LIST)
-color_image = canvas.get_image().copy()
-canvas.fill_rgb([0, 0, 0])
-bw_image = canvas.get_image()
-
-# Create the image into which we'll paste the maze
-full_canvas = Canvas(size=Canvas.LETTER, dpi=300, color=Canvas.COLORS['WHITE'])
-full_image = full_canvas.get_image()
+# Create the page onto which we'll draw the maze
+full_canvas = IndexCanvas(size=Canvas.LETTER, dpi=300)
 
-# Scale the two images appropriately
+# Draw a copy with all walls black in the top half and a copy with colored
+# walls in the bottom half
 half_height = full_canvas.height / 2
-new_size = canvas.compute_max_resize(
-    full_canvas.width * MAX_IMAGE_SIZE, half_height * MAX_IMAGE_SIZE)
-color_image = color_image.resize(new_size, Image.NEAREST)
-bw_image = bw_image.resize(new_size, Image.NEAREST)
-
-# Create a copy and change all colors to opaque black
-bw_pos = (
-    (full_canvas.width - new_size[0]) / 2,
-    (half_height - new_size[1]) / 2)
-color_pos = (bw_pos[0], bw_pos[1] + half_height)
-full_image.alpha_composite(bw_image, dest=bw_pos)
-full_image.alpha_composite(color_image, dest=color_pos)
+box_size = (
+    int(full_canvas.width * MAX_IMAGE_SIZE), int(half_height * MAX_IMAGE_SIZE))
+bw_box = (
+    (full_canvas.width - box_size[0]) / 2,
+    (half_height - box_size[1]) / 2,
+    box_size[0],
+    box_size[1])
+color_box = (bw_box[0], bw_box[1] + half_height, box_size[0], box_size[1])
+maze.draw_in_box(full_canvas, bw_box, index=IndexCanvas.BLACK)
+maze.draw_in_box(full_canvas, color_box)
 
 # Save the full image
-full_image.save('images/maze_simple.png')
+full_canvas.save('images/maze_simple.png', COLOR_LIST)
+
+# And an answer key with the solution drawn over the colored copy
+path = solver.solve(maze)
+solver.draw_path_in_box(
+    full_canvas, maze, path, color_box, color=IndexCanvas.BLACK,
+    start=exits[0], end=exits[1])
+full_canvas.save('images/maze_simple_solution.png', COLOR_LIST)
+
+# The same page as vector output, which prints sharper and is much smaller
+page = VectorPage(Canvas.LETTER)
+scale = page.width / full_canvas.width
+page.draw_in_box(maze, [v * scale for v in bw_box])
+page.draw_in_box(maze, [v * scale for v in color_box], color_list=COLOR_LIST)
+page.save_pdf('images/maze_simple.pdf')
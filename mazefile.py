@@ -0,0 +1,163 @@
+import json
+import struct
+import numpy as np
+from maze import Edge
+from maze import Maze
+
+# A compact file format for mazes. A file is laid out as
+#
+#   header    HEADER, little endian: magic, version, encoding, width, height,
+#             metadata length and data offset
+#   metadata  UTF-8 JSON with the exits, params, wall sizes and number of
+#             edges
+#   data      the edge states in Maze.edges order, starting at a multiple of
+#             ALIGNMENT bytes
+#
+# Edge states are stored in one of these encodings:
+#
+#   ENCODING_STATES  Two bits per edge, four edges per byte, lowest bits
+#                    first: 0 for EMPTY, 1 for a wall, 2 for RESERVED and 3
+#                    for PAINTED. Wall ids are lost; every wall loads as wall
+#                    0, with the size of all of them together.
+#   ENCODING_INT8, ENCODING_INT16, ENCODING_INT32
+#                    The states as they are, in the smallest type that fits.
+#
+# INT32 data is laid out exactly like Maze.edges, so load can memory map it
+# and use it without copying. The smaller encodings are decoded into a new
+# array.
+
+MAGIC = b'MAZEKIT\x00'
+VERSION = 1
+HEADER = struct.Struct('<8sHHIIIQ')
+ALIGNMENT = 64
+
+ENCODING_STATES = 0
+ENCODING_INT8 = 1
+ENCODING_INT16 = 2
+ENCODING_INT32 = 3
+
+INT_DTYPES = {
+    ENCODING_INT8: np.dtype('<i1'),
+    ENCODING_INT16: np.dtype('<i2'),
+    ENCODING_INT32: np.dtype('<i4'),
+}
+
+# The state each 2 bit code loads as.
+_CODE_STATES = np.array(
+    [Maze.EMPTY, 0, Maze.RESERVED, Maze.PAINTED], dtype=np.int32)
+# Every byte of packed codes unpacked into its four states.
+_BYTE_STATES = _CODE_STATES[
+    (np.arange(256)[:, np.newaxis] >> np.array([0, 2, 4, 6])) & 3]
+
+
+def _encoding_for(edges, wall_ids):
+  if not wall_ids:
+    return ENCODING_STATES
+  top = int(edges.max()) if len(edges) else 0
+  for encoding in [ENCODING_INT8, ENCODING_INT16]:
+    if top <= np.iinfo(INT_DTYPES[encoding]).max:
+      return encoding
+  return ENCODING_INT32
+
+
+def _pack_states(edges):
+  codes = np.zeros(len(edges), dtype=np.uint8)
+  codes[edges >= 0] = 1
+  codes[edges == Maze.RESERVED] = 2
+  codes[edges == Maze.PAINTED] = 3
+  codes = np.concatenate(
+      (codes, np.zeros(-len(codes) % 4, dtype=np.uint8))).reshape(-1, 4)
+  return (
+      codes[:, 0] | (codes[:, 1] << 2) | (codes[:, 2] << 4)
+      | (codes[:, 3] << 6)).astype(np.uint8)
+
+
+def _data_offset(metadata_length):
+  return -(-(HEADER.size + metadata_length) // ALIGNMENT) * ALIGNMENT
+
+
+# Saves the maze. With wall_ids, the edge states are kept exactly, otherwise
+# only whether each edge is empty, a wall, reserved or painted is kept, in a
+# sixteenth of the space.
+def save(maze, filename, wall_ids=True):
+  edges = maze.edges
+  encoding = _encoding_for(edges, wall_ids)
+  if encoding == ENCODING_STATES:
+    data = _pack_states(edges)
+  else:
+    data = edges.astype(INT_DTYPES[encoding], copy=False)
+  wall_size = list(maze.wall_size)
+  if encoding == ENCODING_STATES and wall_size:
+    wall_size = [sum(wall_size)]
+  metadata = json.dumps({
+      'exits': [(e.ori, e.x, e.y) for e in maze.exits],
+      'params': maze.params,
+      'wall_size': wall_size,
+      'num_edges': len(edges),
+  }).encode('utf-8')
+  data_offset = _data_offset(len(metadata))
+  with open(filename, 'wb') as f:
+    f.write(HEADER.pack(
+        MAGIC, VERSION, encoding, maze.width, maze.height, len(metadata),
+        data_offset))
+    f.write(metadata)
+    f.write(b'\x00' * (data_offset - HEADER.size - len(metadata)))
+    data.tofile(f)
+
+
+# Returns the header fields and the metadata of a saved maze.
+def read_header(filename):
+  with open(filename, 'rb') as f:
+    header = f.read(HEADER.size)
+    if len(header) < HEADER.size:
+      raise ValueError('%s is not a maze file' % filename)
+    (magic, version, encoding, width, height, metadata_length,
+     data_offset) = HEADER.unpack(header)
+    if magic != MAGIC:
+      raise ValueError('%s is not a maze file' % filename)
+    if version != VERSION:
+      raise ValueError('%s has unsupported version %d' % (filename, version))
+    metadata = json.loads(f.read(metadata_length).decode('utf-8'))
+  return {
+      'encoding': encoding,
+      'width': width,
+      'height': height,
+      'data_offset': data_offset,
+      'metadata': metadata,
+  }
+
+
+# Loads a saved maze. INT32 data is memory mapped with the given np.memmap
+# mode: 'r' for a read-only maze (e.g. for drawing or solving), 'c' for
+# copy-on-write or 'r+' to write changes back to the file. With mode=None,
+# or for any other encoding, the edges are read into memory.
+def load(filename, mode='r'):
+  header = read_header(filename)
+  encoding = header['encoding']
+  metadata = header['metadata']
+  num_edges = metadata['num_edges']
+  offset = header['data_offset']
+  if encoding == ENCODING_STATES:
+    data = np.memmap(
+        filename, dtype=np.uint8, mode='r', offset=offset,
+        shape=(-(-num_edges // 4),))
+    edges = _BYTE_STATES[data].reshape(-1)[:num_edges]
+  elif encoding in INT_DTYPES:
+    dtype = INT_DTYPES[encoding]
+    if encoding == ENCODING_INT32 and mode is not None:
+      edges = np.memmap(
+          filename, dtype=dtype, mode=mode, offset=offset,
+          shape=(num_edges,))
+    else:
+      with open(filename, 'rb') as f:
+        f.seek(offset)
+        edges = np.fromfile(f, dtype=dtype, count=num_edges)
+      edges = edges.astype(np.int32)
+  else:
+    raise ValueError('%s has unknown encoding %d' % (filename, encoding))
+
+  maze = Maze(header['width'], header['height'], edges=edges)
+  maze.exits = [Edge(*e) for e in metadata['exits']]
+  maze.params = metadata['params']
+  maze.wall_size = list(metadata.get('wall_size', []))
+  return maze
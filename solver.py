@@ -0,0 +1,146 @@
+import numpy as np
+from canvas import Canvas
+from maze import Edge
+from maze import Maze
+
+# Finds paths through mazes and draws them over the maze. Cells are the
+# squares of the maze, (x, y) with (0, 0) at the bottom left, and are
+# numbered y * width + x.
+
+# Bits of the directions out of a cell that aren't blocked by a wall, in the
+# same west, east, south, north order as Grid.point_edges.
+WEST = 1
+EAST = 2
+SOUTH = 4
+NORTH = 8
+
+DIRECTIONS = [WEST, EAST, SOUTH, NORTH]
+
+# For every 4 bit mask of open directions, which of the DIRECTIONS are open.
+_OPEN = ((np.arange(16)[:, np.newaxis] >> np.arange(4)) & 1).astype(bool)
+
+
+# Returns a (height, width) uint8 array of the directions you can move out of
+# every cell. Drawn edges (walls and painted edges) block movement, and
+# moving off the grid is never allowed, even through an exit.
+def open_directions(maze):
+  horz = ~Maze._drawn(maze.edge_blocks[Edge.HORZ])
+  vert = ~Maze._drawn(maze.edge_blocks[Edge.VERT])
+  open_dirs = np.zeros((maze.height, maze.width), dtype=np.uint8)
+  open_dirs[:, 1:] |= vert[:, 1:-1] * np.uint8(WEST)
+  open_dirs[:, :-1] |= vert[:, 1:-1] * np.uint8(EAST)
+  open_dirs[1:, :] |= horz[1:-1, :] * np.uint8(SOUTH)
+  open_dirs[:-1, :] |= horz[1:-1, :] * np.uint8(NORTH)
+  return open_dirs
+
+
+# Returns the (x, y) cell just inside a border edge.
+def exit_cell(maze, edge):
+  if edge.ori == Edge.HORZ:
+    return (edge.x, 0 if edge.y == 0 else maze.height - 1)
+  return (0 if edge.x == 0 else maze.width - 1, edge.y)
+
+
+# Returns the (x, y) cell of an (x, y) cell or a border edge.
+def as_cell(maze, end):
+  if isinstance(end, Edge):
+    return exit_cell(maze, end)
+  return tuple(end)
+
+
+# Returns a shortest path from start to end as an (N, 2) array of (x, y)
+# cells, or None if there isn't one. start and end are (x, y) cells or border
+# edges, and default to the first two of maze.exits.
+#
+# The search is a breadth first search that expands the whole frontier at
+# once with array operations, and only keeps the open directions and the
+# direction every cell was reached from, a byte each per cell.
+def solve(maze, start=None, end=None):
+  if start is None or end is None:
+    if len(maze.exits) < 2:
+      raise ValueError('The maze needs two exits, or a start and an end')
+    start = maze.exits[0] if start is None else start
+    end = maze.exits[1] if end is None else end
+  width = maze.width
+  start_x, start_y = as_cell(maze, start)
+  end_x, end_y = as_cell(maze, end)
+  start_cell = start_y * width + start_x
+  end_cell = end_y * width + end_x
+
+  open_dirs = open_directions(maze).ravel()
+  # Cell number change of a move in each of DIRECTIONS.
+  moves = np.array([-1, 1, -width, width])
+  # 1 + the index in DIRECTIONS of the move back towards start from every
+  # reached cell, or 0 for cells that haven't been reached.
+  back = np.zeros(len(open_dirs), dtype=np.uint8)
+  # Moving in direction i comes back the opposite way.
+  opposite = np.array([2, 1, 4, 3], dtype=np.uint8)
+  back[start_cell] = 5
+  frontier = np.array([start_cell])
+  while back.item(end_cell) == 0 and len(frontier):
+    cells, directions = np.nonzero(_OPEN[open_dirs[frontier]])
+    reached = frontier[cells] + moves[directions]
+    new = back[reached] == 0
+    reached = reached[new]
+    back[reached] = opposite[directions[new]]
+    # A cell can be reached from two frontier cells at once where there are
+    # loops.
+    frontier = np.unique(reached)
+  if back.item(end_cell) == 0:
+    return None
+
+  # Walk back from the end.
+  path = [end_cell]
+  cell = end_cell
+  back_moves = [0] + moves.tolist()
+  while cell != start_cell:
+    cell += back_moves[back.item(cell)]
+    path.append(cell)
+  path = np.array(path[::-1])
+  return np.column_stack((path % width, path // width))
+
+
+# Returns the points the path goes through in grid coordinates: the centers
+# of its first and last cells and of the cells where it turns. If start or
+# end are border edges, the path goes on to the middle of the edge.
+def path_points(path, start=None, end=None):
+  path = np.asarray(path)
+  turns = np.nonzero(np.any(
+      np.diff(path[:-1], axis=0) != np.diff(path[1:], axis=0), axis=1))[0]
+  corners = path[np.concatenate(([0], turns + 1, [len(path) - 1]))]
+  points = [corners + 0.5]
+  for i, edge in [(0, start), (len(points[0]), end)]:
+    if isinstance(edge, Edge):
+      middle = (
+          (edge.x + 0.5, edge.y) if edge.ori == Edge.HORZ
+          else (edge.x, edge.y + 0.5))
+      points.insert(i, np.array([middle]))
+  return np.concatenate(points)
+
+
+# Draws the path (as returned by solve) over a maze drawn with
+# Maze.draw(canvas, pos, pixels_per_square, line_width), through the middle
+# of its cells and line_width pixels wide. color is an RGBA color for a
+# Canvas or an index for an IndexCanvas. start and end are as in path_points.
+def draw_path(canvas, maze, path, pos, pixels_per_square, line_width=1,
+              color=Canvas.COLORS['RED'], start=None, end=None):
+  points = path_points(path, start, end)
+  # Pixel offsets of the top left of the path at each point.
+  cols = np.rint(pos[0] + points[:, 0] * pixels_per_square).astype(int)
+  rows = np.rint(
+      pos[1] + (maze.height - points[:, 1]) * pixels_per_square).astype(int)
+  image = canvas.image_data
+  for i in xrange(0, len(points) - 1):
+    col0, col1 = sorted(cols[i:i + 2])
+    row0, row1 = sorted(rows[i:i + 2])
+    image[row0:row1 + line_width, col0:col1 + line_width] = color
+
+
+# Draws the path over a maze drawn with Maze.draw_in_box(canvas, box,
+# line_width).
+def draw_path_in_box(canvas, maze, path, box, line_width=None,
+                     color=Canvas.COLORS['RED'], start=None, end=None):
+  pos, pixels_per_square, line_width = maze.layout_in_box(box, line_width)
+  draw_path(
+      canvas, maze, path, pos, pixels_per_square, line_width, color, start,
+      end)
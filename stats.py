@@ -0,0 +1,163 @@
+import sys
+import timeit
+
+_timer = timeit.default_timer
+
+
+# Receives callbacks from Maze.generate_each_wall. Subclasses override the
+# ones they care about.
+class GenerationObserver(object):
+
+  # Called before the maze state is initialized from its edges.
+  def start(self, maze):
+    pass
+
+  # Called after initialization (step 0) and after every round of growing
+  # each wall once.
+  def round(self, maze, step):
+    pass
+
+  # Called when generation finishes or the generator is closed.
+  def finish(self, maze):
+    pass
+
+
+# Records where the time goes during generation: per round and per wall
+# growth counts, frontier sizes and time in grow_wall, calls to and time in
+# take_point and add_potential, and point claim conflicts: potential claims
+# dropped when another edge took their point.
+#
+# The maze's internal methods are timed by shadowing them with instance
+# attributes for the duration of the generation, so mazes without an observer
+# run the usual code. Times of grow_wall include the take_point and
+# add_potential calls it makes.
+class GenerationStats(GenerationObserver):
+
+  TIMED_METHODS = [
+      ('initialize', 'initialize_state_from_edges'),
+      ('take_point', '_take_point'),
+      ('add_potential', '_add_potential'),
+  ]
+
+  def __init__(self):
+    self.start_time = None
+    self.seconds = 0.
+    # Per round dicts of step, walls grown, total frontier size and seconds.
+    self.rounds = []
+    # Per wall totals.
+    self.wall_growth = []
+    self.wall_seconds = []
+    self.wall_max_frontier = []
+    # Name -> [calls, seconds]
+    self.timers = {}
+    # Potential claims on a point, other than the one a wall grew through,
+    # removed when the point was taken.
+    self.claims_dropped = 0
+    self.memory = None
+    self._round_start = None
+    self._round_growth = 0
+
+  def _time(self, name, method):
+    timer = self.timers.setdefault(name, [0, 0.])
+    def timed(*args):
+      start = _timer()
+      result = method(*args)
+      timer[1] += _timer() - start
+      timer[0] += 1
+      return result
+    return timed
+
+  def start(self, maze):
+    self.start_time = _timer()
+    for name, attr in GenerationStats.TIMED_METHODS:
+      setattr(maze, attr, self._time(name, getattr(maze, attr)))
+
+    # Count claims that _take_point drops.
+    take_point = maze._take_point
+    claim_mask = maze._POINT_CLAIMS
+    def counted_take_point(p):
+      claims = maze.points.item(p) & claim_mask
+      while claims:
+        claims &= claims - 1
+        self.claims_dropped += 1
+      take_point(p)
+    maze._take_point = counted_take_point
+
+    grow_wall = maze._grow_wall
+    timer = self.timers.setdefault('grow_wall', [0, 0.])
+    def timed_grow_wall(wall, same_branch_probability):
+      start = _timer()
+      new_e = grow_wall(wall, same_branch_probability)
+      seconds = _timer() - start
+      timer[0] += 1
+      timer[1] += seconds
+      self._grown(maze, wall, new_e >= 0, seconds)
+      return new_e
+    maze._grow_wall = timed_grow_wall
+    self._round_start = _timer()
+
+  def _grown(self, maze, wall, grew, seconds):
+    while len(self.wall_growth) <= wall:
+      self.wall_growth.append(0)
+      self.wall_seconds.append(0.)
+      self.wall_max_frontier.append(0)
+    self.wall_seconds[wall] += seconds
+    frontier = len(maze.potential_edge_points[wall])
+    if frontier > self.wall_max_frontier[wall]:
+      self.wall_max_frontier[wall] = frontier
+    if grew:
+      self.wall_growth[wall] += 1
+      self._round_growth += 1
+      # The claim of the edge the wall grew through isn't a conflict.
+      self.claims_dropped -= 1
+
+  def round(self, maze, step):
+    now = _timer()
+    self.rounds.append({
+        'step': step,
+        'grown': self._round_growth,
+        'frontier': sum(len(pe) for pe in maze.potential_edge_points),
+        'seconds': now - self._round_start,
+    })
+    self._round_growth = 0
+    self._round_start = now
+
+  def finish(self, maze):
+    self.seconds = _timer() - self.start_time
+    # Remove the instance attributes so the class methods show through again.
+    for attr in ['_grow_wall', '_take_point', '_add_potential',
+                 'initialize_state_from_edges']:
+      if attr in maze.__dict__:
+        del maze.__dict__[attr]
+    self.memory = maze.memory_usage()
+
+  def summary(self):
+    lines = []
+    lines.append('Generation took %.3fs over %d rounds' % (
+        self.seconds, max(0, len(self.rounds) - 1)))
+    for name in ['initialize', 'grow_wall', 'take_point', 'add_potential']:
+      calls, seconds = self.timers.get(name, [0, 0.])
+      lines.append('  %-14s %10d calls %10.3fs' % (name, calls, seconds))
+    lines.append('  claims dropped when their point was taken: %d' %
+                 self.claims_dropped)
+    if self.rounds:
+      busiest = max(self.rounds, key=lambda r: r['frontier'])
+      lines.append('  largest frontier: %d edges at round %d' % (
+          busiest['frontier'], busiest['step']))
+    if self.wall_growth:
+      walls = sorted(
+          xrange(0, len(self.wall_growth)),
+          key=lambda wall: -self.wall_seconds[wall])
+      lines.append('  walls by time in grow_wall:')
+      for wall in walls[:5]:
+        lines.append('    wall %5d: %8d edges %10.3fs, max frontier %d' % (
+            wall, self.wall_growth[wall], self.wall_seconds[wall],
+            self.wall_max_frontier[wall]))
+    if self.memory:
+      lines.append('  memory: %s' % ', '.join(
+          '%s %.1fKB' % (name, size / 1024.)
+          for name, size in sorted(self.memory.items())))
+    return '\n'.join(lines)
+
+  def report(self, out=sys.stdout):
+    out.write(self.summary() + '\n')
@@ -0,0 +1,225 @@
+import json
+import os
+import random
+import numpy as np
+from maze import Edge
+from maze import Maze
+
+class TiledMaze(object):
+
+  METADATA_FILE = 'maze.json'
+  WALLS_FILE = 'walls.npy'
+
+  # A maze whose edge states are stored on disk in directory, split into
+  # tile_size x tile_size tiles (the last column and row of tiles take up the
+  # remainder, so they can be up to twice as big). Each tile is stored in its
+  # own memory mapped file, laid out like Maze.edges for a maze the size of
+  # the tile, so any tile can be used as a regular Maze. Edges on the border
+  # between two tiles are stored in both of them.
+  def __init__(self, directory, width, height, tile_size):
+    if tile_size < 3:
+      raise ValueError('Tiles must be at least 3 squares wide')
+    self.directory = directory
+    self.width = width
+    self.height = height
+    self.tile_size = tile_size
+    self.tiles_x = max(1, width // tile_size)
+    self.tiles_y = max(1, height // tile_size)
+    self.exits = []
+    self.same_branch_probability = None
+    self.seed = None
+    # Position of the opening along the shared border of each pair of
+    # adjacent tiles, or -1 if they aren't connected. vert_openings[ty][tx]
+    # is the border on the left of tile (tx, ty) and horz_openings[ty][tx]
+    # the one below it.
+    self.vert_openings = None
+    self.horz_openings = None
+    self._open_tile = None
+    if not os.path.isdir(directory):
+      os.makedirs(directory)
+
+  @staticmethod
+  def open(directory):
+    with open(os.path.join(directory, TiledMaze.METADATA_FILE)) as f:
+      metadata = json.load(f)
+    tiled = TiledMaze(
+        directory, metadata['width'], metadata['height'],
+        metadata['tile_size'])
+    tiled.exits = [Edge(*e) for e in metadata['exits']]
+    tiled.same_branch_probability = metadata['same_branch_probability']
+    tiled.seed = metadata['seed']
+    tiled.vert_openings = np.array(metadata['vert_openings'], dtype=np.int32)
+    tiled.horz_openings = np.array(metadata['horz_openings'], dtype=np.int32)
+    return tiled
+
+  def _save_metadata(self):
+    metadata = {
+        'width': self.width,
+        'height': self.height,
+        'tile_size': self.tile_size,
+        'exits': [(e.ori, e.x, e.y) for e in self.exits],
+        'same_branch_probability': self.same_branch_probability,
+        'seed': self.seed,
+        'vert_openings': self.vert_openings.tolist(),
+        'horz_openings': self.horz_openings.tolist(),
+    }
+    with open(os.path.join(self.directory, TiledMaze.METADATA_FILE), 'w') as f:
+      json.dump(metadata, f)
+
+  # Returns (x, y, width, height) of the tile in maze coordinates.
+  def tile_bounds(self, tx, ty):
+    x = tx * self.tile_size
+    y = ty * self.tile_size
+    return (
+        x, y,
+        self.tile_size if tx < self.tiles_x - 1 else self.width - x,
+        self.tile_size if ty < self.tiles_y - 1 else self.height - y)
+
+  def _tile_filename(self, tx, ty):
+    return os.path.join(self.directory, 'tile_%d_%d.edges' % (tx, ty))
+
+  # Returns a Maze for the tile whose edge states are memory mapped from the
+  # tile's file. Only the edge states are loaded, so wall sizes and potential
+  # edges have to be rebuilt with initialize_state_from_edges() if needed.
+  def tile(self, tx, ty, mode='r+'):
+    x, y, width, height = self.tile_bounds(tx, ty)
+    filename = self._tile_filename(tx, ty)
+    num_edges = 2 * width * height + width + height
+    if not os.path.exists(filename):
+      edges = np.memmap(filename, dtype=np.int32, mode='w+', shape=(num_edges,))
+      edges[:] = Maze.EMPTY
+      edges.flush()
+      del edges
+    edges = np.memmap(filename, dtype=np.int32, mode=mode, shape=(num_edges,))
+    return Maze(width, height, edges=edges)
+
+  def iter_tiles(self, mode='r'):
+    for ty in xrange(0, self.tiles_y):
+      for tx in xrange(0, self.tiles_x):
+        yield tx, ty, self.tile(tx, ty, mode)
+
+  # Returns the tile that stores an edge, preferring the tile above or to the
+  # right of it for edges on a border between tiles.
+  def _tile_of_edge(self, edge):
+    tx = min(edge.x // self.tile_size, self.tiles_x - 1)
+    ty = min(edge.y // self.tile_size, self.tiles_y - 1)
+    return tx, ty
+
+  # Returns the state of an edge. Wall ids are local to the tile storing it.
+  def get_edge(self, edge):
+    tx, ty = self._tile_of_edge(edge)
+    if self._open_tile is None or self._open_tile[0] != (tx, ty):
+      self._open_tile = ((tx, ty), self.tile(tx, ty, mode='r'))
+    x, y, width, height = self.tile_bounds(tx, ty)
+    return self._open_tile[1].get_edge(Edge(edge.ori, edge.x - x, edge.y - y))
+
+  # Same as Maze.choose_exits, without building the whole border.
+  def choose_exits(self, num_exits):
+    # The border edges that Maze.border_iter yields with a perpendicular edge.
+    sides = [
+        lambda i: Edge(Edge.HORZ, i, 0),
+        lambda i: Edge(Edge.VERT, self.width, i),
+        lambda i: Edge(Edge.HORZ, i + 1, self.height),
+        lambda i: Edge(Edge.VERT, 0, i + 1),
+    ]
+    lengths = [self.width - 1, self.height - 1, self.width - 1, self.height - 1]
+    exits = []
+    for i in random.sample(xrange(0, sum(lengths)), num_exits):
+      side = 0
+      while i >= lengths[side]:
+        i -= lengths[side]
+        side += 1
+      exits.append(sides[side](i))
+    return exits
+
+  # Returns the tile and the tile's border edge for a maze border edge.
+  def _exit_in_tile(self, edge):
+    tx, ty = self._tile_of_edge(edge)
+    x, y, width, height = self.tile_bounds(tx, ty)
+    return tx, ty, Edge(edge.ori, edge.x - x, edge.y - y)
+
+  # Connects the tiles with a spanning tree, by generating a maze with one
+  # square per tile and opening a random edge on the border between every
+  # pair of tiles that aren't separated by a wall in it. Openings are never
+  # at the ends of a border, so two of them can't meet at a tile's corner and
+  # leave a point on the tile's border that no wall touches.
+  def _choose_openings(self, same_branch_probability):
+    tiles = Maze(self.tiles_x, self.tiles_y)
+    tile_exits = []
+    for edge in self.exits:
+      tx, ty, tile_edge = self._exit_in_tile(edge)
+      tile_exits.append(Edge(
+          edge.ori,
+          tx + (edge.ori == Edge.VERT and edge.x == self.width),
+          ty + (edge.ori == Edge.HORZ and edge.y == self.height)))
+    tiles.create_border(tile_exits)
+    tiles.generate_all_walls(same_branch_probability)
+
+    connected = tiles.edge_blocks[Edge.VERT] < 0
+    connected[:, [0, -1]] = False
+    lengths = np.array(
+        [self.tile_bounds(0, j)[3] for j in xrange(0, self.tiles_y)])
+    offsets = 1 + (np.random.random_sample(connected.shape)
+        * (lengths[:, np.newaxis] - 2)).astype(np.int32)
+    self.vert_openings = np.where(connected, offsets, -1)
+
+    connected = tiles.edge_blocks[Edge.HORZ] < 0
+    connected[[0, -1], :] = False
+    lengths = np.array(
+        [self.tile_bounds(i, 0)[2] for i in xrange(0, self.tiles_x)])
+    offsets = 1 + (np.random.random_sample(connected.shape)
+        * (lengths[np.newaxis, :] - 2)).astype(np.int32)
+    self.horz_openings = np.where(connected, offsets, -1)
+
+  # Returns the border edges of a tile that are left open.
+  def _tile_exits(self, tx, ty):
+    x, y, width, height = self.tile_bounds(tx, ty)
+    exits = []
+    for edge in self.exits:
+      edge_tx, edge_ty, tile_edge = self._exit_in_tile(edge)
+      if (edge_tx, edge_ty) == (tx, ty):
+        exits.append(tile_edge)
+    if self.vert_openings[ty, tx] >= 0:
+      exits.append(Edge(Edge.VERT, 0, self.vert_openings[ty, tx]))
+    if self.vert_openings[ty, tx + 1] >= 0:
+      exits.append(Edge(Edge.VERT, width, self.vert_openings[ty, tx + 1]))
+    if self.horz_openings[ty, tx] >= 0:
+      exits.append(Edge(Edge.HORZ, self.horz_openings[ty, tx], 0))
+    if self.horz_openings[ty + 1, tx] >= 0:
+      exits.append(Edge(Edge.HORZ, self.horz_openings[ty + 1, tx], height))
+    return exits
+
+  # Generates the maze one tile at a time, so only a single tile is ever in
+  # memory. Each tile is a perfect maze whose border is only open at the
+  # openings to other tiles and at the maze exits, and the openings follow a
+  # spanning tree of the tiles, so the whole maze is connected and loop-free.
+  # If seed is given, each tile is generated from its own seed derived from
+  # it, so tiles can be regenerated independently.
+  def generate(self, same_branch_probability, exits=None, seed=None):
+    self.same_branch_probability = same_branch_probability
+    self.seed = seed
+    if seed is not None:
+      random.seed(seed)
+      np.random.seed(seed % (2 ** 32))
+    self.exits = exits if exits is not None else self.choose_exits(2)
+    self._choose_openings(same_branch_probability)
+    self._save_metadata()
+
+    walls = np.lib.format.open_memmap(
+        os.path.join(self.directory, TiledMaze.WALLS_FILE), mode='w+',
+        dtype=np.int32, shape=(self.tiles_y, self.tiles_x))
+    for ty in xrange(0, self.tiles_y):
+      for tx in xrange(0, self.tiles_x):
+        if seed is not None:
+          random.seed((seed, tx, ty))
+        walls[ty, tx] = self.generate_tile(tx, ty)
+    walls.flush()
+
+  # Generates a single tile, returning its number of walls.
+  def generate_tile(self, tx, ty):
+    maze = self.tile(tx, ty, mode='r+')
+    maze.edges[:] = Maze.EMPTY
+    maze.create_border(self._tile_exits(tx, ty))
+    maze.generate_all_walls(self.same_branch_probability)
+    maze.edges.flush()
+    return maze.num_walls()
@@ -0,0 +1,44 @@
+import numpy as np
+
+# Array-based union-find for labeling the connected components of a graph in
+# bulk, without visiting its nodes one at a time in Python.
+
+
+# Replaces every parent with its root by pointer jumping.
+def flatten(parent):
+  while True:
+    grandparent = parent[parent]
+    if np.array_equal(grandparent, parent):
+      return parent
+    parent = grandparent
+
+
+# Merges the sets of a[i] and b[i] for every i, starting from the forest given
+# by parent (or singletons if it's None), and returns the flattened forest.
+# Each root is the smallest node of its set.
+def union(num_nodes, a, b, parent=None):
+  if parent is None:
+    parent = np.arange(num_nodes, dtype=np.int32)
+  else:
+    parent = flatten(parent)
+  a = np.asarray(a, dtype=np.int32)
+  b = np.asarray(b, dtype=np.int32)
+  while True:
+    root_a = parent[a]
+    root_b = parent[b]
+    differ = root_a != root_b
+    if not differ.any():
+      return parent
+    a = a[differ]
+    b = b[differ]
+    # Hook the larger root under the smaller one. When a root gets several
+    # hooks only one of them sticks, and the rest are retried next round.
+    low = np.minimum(root_a[differ], root_b[differ])
+    high = np.maximum(root_a[differ], root_b[differ])
+    parent[high] = low
+    parent = flatten(parent)
+
+
+# Returns the root of every node of the graph with the given edges.
+def label_components(num_nodes, a, b):
+  return union(num_nodes, a, b)
@@ -0,0 +1,147 @@
+import zlib
+from canvas import Canvas
+from maze import Maze
+
+# Vector output for printing mazes. A VectorPage collects mazes drawn as
+# polylines (see Maze.wall_polylines) and is saved as SVG or PDF, or several
+# pages are saved together as one PDF with save_pdf. Page coordinates are in
+# points (1/72 inch) from the top left corner.
+
+POINTS_PER_INCH = 72.
+
+
+def _number(v):
+  return ('%.3f' % v).rstrip('0').rstrip('.')
+
+
+class VectorPage(object):
+
+  # size is the page size in inches.
+  def __init__(self, size=Canvas.LETTER):
+    self.width = size[0] * POINTS_PER_INCH
+    self.height = size[1] * POINTS_PER_INCH
+    # (rgb, line width, list of (N, 2) point arrays) for every stroke style.
+    self.paths = []
+
+  # Draws the maze with its top left corner at pos. Grid lines are
+  # points_per_square apart and line_width wide, and every line is centered
+  # on its grid line with square caps, so the drawing is points_per_square *
+  # size + line_width across. Walls are colored from color_list by wall id,
+  # as in IndexCanvas.get_canvas, or all black if there's no color_list.
+  # Painted edges are always black.
+  def draw(self, maze, pos, points_per_square, line_width, color_list=None):
+    by_color = {}
+    for state, points in maze.wall_polylines(by_wall=color_list is not None):
+      if state == Maze.PAINTED:
+        color = Canvas.COLORS['BLACK']
+      else:
+        color = color_list[state % len(color_list)]
+      page_points = points * points_per_square + (line_width / 2.)
+      page_points[:, 0] += pos[0]
+      page_points[:, 1] = (
+          pos[1] + maze.height * points_per_square + line_width
+          - page_points[:, 1])
+      by_color.setdefault(tuple(color[0:3]), []).append(page_points)
+    for rgb, polylines in sorted(by_color.items()):
+      self.paths.append((rgb, line_width, polylines))
+
+  # Draws the maze as large as it fits, centered in box = (x, y, width,
+  # height), like Maze.draw_in_box. line_width defaults to a quarter of a
+  # square. Returns the points per square that were used.
+  def draw_in_box(self, maze, box, line_width=None, color_list=None):
+    x, y, width, height = box
+    if line_width is None:
+      line_width = min(
+          float(width) / maze.width, float(height) / maze.height) / 4
+    points_per_square = min(
+        float(width - line_width) / maze.width,
+        float(height - line_width) / maze.height)
+    draw_width = maze.width * points_per_square + line_width
+    draw_height = maze.height * points_per_square + line_width
+    pos = (x + (width - draw_width) / 2, y + (height - draw_height) / 2)
+    self.draw(maze, pos, points_per_square, line_width, color_list)
+    return points_per_square
+
+  def svg(self):
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8"?>',
+        '<svg xmlns="http://www.w3.org/2000/svg" version="1.1" '
+        'width="%sin" height="%sin" viewBox="0 0 %s %s">' % (
+            _number(self.width / POINTS_PER_INCH),
+            _number(self.height / POINTS_PER_INCH),
+            _number(self.width), _number(self.height)),
+    ]
+    for rgb, line_width, polylines in self.paths:
+      # The lines are all horizontal or vertical, so every point after the
+      # first of a polyline is an H or V command.
+      commands = []
+      for points in polylines:
+        commands.append('M%s %s' % (
+            _number(points[0, 0]), _number(points[0, 1])))
+        for (x0, y0), (x1, y1) in zip(points[:-1], points[1:]):
+          if y0 == y1:
+            commands.append('H%s' % _number(x1))
+          else:
+            commands.append('V%s' % _number(y1))
+      lines.append(
+          '<path fill="none" stroke="rgb(%d,%d,%d)" stroke-width="%s" '
+          'stroke-linecap="square" d="%s"/>' % (
+              rgb + (_number(line_width), ''.join(commands))))
+    lines.append('</svg>')
+    return '\n'.join(lines) + '\n'
+
+  # Returns the PDF content stream that draws the page.
+  def pdf_content(self):
+    # Flip the y axis so that page coordinates work as they are.
+    lines = ['1 0 0 -1 0 %s cm 2 J' % _number(self.height)]
+    for rgb, line_width, polylines in self.paths:
+      lines.append('%s %s %s RG %s w' % (
+          tuple(_number(c / 255.) for c in rgb) + (_number(line_width),)))
+      for points in polylines:
+        lines.append('%s %s m' % (
+            _number(points[0, 0]), _number(points[0, 1])))
+        lines.extend(
+            '%s %s l' % (_number(x), _number(y)) for x, y in points[1:])
+      lines.append('S')
+    return '\n'.join(lines) + '\n'
+
+  def save_svg(self, filename):
+    with open(filename, 'w') as f:
+      f.write(self.svg())
+
+  def save_pdf(self, filename):
+    save_pdf(filename, [self])
+
+
+# Saves the pages as one PDF, one VectorPage per page.
+def save_pdf(filename, pages):
+  # Objects 1 and 2 are the catalog and the page tree, followed by a page and
+  # a content stream object for every page.
+  objects = [
+      '<< /Type /Catalog /Pages 2 0 R >>',
+      '<< /Type /Pages /Kids [%s] /Count %d >>' % (
+          ' '.join('%d 0 R' % (3 + 2 * i) for i in xrange(0, len(pages))),
+          len(pages)),
+  ]
+  for i, page in enumerate(pages):
+    objects.append(
+        '<< /Type /Page /Parent 2 0 R /MediaBox [0 0 %s %s] '
+        '/Contents %d 0 R >>' % (
+            _number(page.width), _number(page.height), 4 + 2 * i))
+    content = zlib.compress(page.pdf_content())
+    objects.append(
+        '<< /Length %d /Filter /FlateDecode >>\nstream\n%s\nendstream' % (
+            len(content), content))
+
+  with open(filename, 'wb') as f:
+    f.write('%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    offsets = []
+    for number, body in enumerate(objects, 1):
+      offsets.append(f.tell())
+      f.write('%d 0 obj\n%s\nendobj\n' % (number, body))
+    xref = f.tell()
+    f.write('xref\n0 %d\n0000000000 65535 f \n' % (len(objects) + 1))
+    for offset in offsets:
+      f.write('%010d 00000 n \n' % offset)
+    f.write('trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (
+        len(objects) + 1, xref))
@@ -1,26 +1,78 @@
 import numpy as np
 
-def identity():
-  return np.matrix([[1., 0., 0.],
-                    [0., 1., 0.],
-                    [0., 0., 1.]])
+# Transforms are 3x3 affine matrices that apply to (x, y, 1) row vectors, so
+# A * B applies A first and then B.
+#
+# The functions returning np.matrix are kept for existing callers. The *_array
+# versions return plain ndarrays, which work with compose and apply on single
+# transforms as well as on (..., 3, 3) stacks of them.
 
-def rotate(clockwise):
+def identity_array():
+  return np.array([[1., 0., 0.],
+                   [0., 1., 0.],
+                   [0., 0., 1.]])
+
+def rotate_array(clockwise):
   if clockwise:
-    return np.matrix([[ 0., -1.,  0.],
-                      [ 1.,  0.,  0.],
-                      [ 0.,  0.,  1.]])
+    return np.array([[ 0., -1.,  0.],
+                     [ 1.,  0.,  0.],
+                     [ 0.,  0.,  1.]])
   else:
-    return np.matrix([[ 0.,  1.,  0.],
-                      [-1.,  0.,  0.],
-                      [ 0.,  0.,  1.]])
+    return np.array([[ 0.,  1.,  0.],
+                     [-1.,  0.,  0.],
+                     [ 0.,  0.,  1.]])
+
+def scale_array(x, y):
+  return np.array([[ x, 0., 0.],
+                   [0.,  y, 0.],
+                   [0., 0., 1.]])
+
+def translate_array(x, y):
+  return np.array([[1., 0., 0.],
+                   [0., 1., 0.],
+                   [ x,  y, 1.]])
+
+def identity():
+  return np.matrix(identity_array())
+
+def rotate(clockwise):
+  return np.matrix(rotate_array(clockwise))
 
 def scale(x, y):
-  return np.matrix([[ x, 0., 0.],
-                    [0.,  y, 0.],
-                    [0., 0., 1.]])
+  return np.matrix(scale_array(x, y))
 
 def translate(x, y):
-  return np.matrix([[1., 0., 0.],
-                    [0., 1., 0.],
-                    [ x,  y, 1.]])
+  return np.matrix(translate_array(x, y))
+
+# Returns the transforms as one (N, 3, 3) array.
+def stack(xfms):
+  return np.array([np.asarray(xfm, dtype=float) for xfm in xfms])
+
+# Returns the transform that applies each of xfms in turn, first to last. Any
+# of them can be a stack of transforms, and stacks are broadcast against each
+# other like any other ndarray, e.g. composing an (N, 1, 3, 3) stack with an
+# (M, 3, 3) one gives every one of the N * M combinations.
+def compose(*xfms):
+  result = np.asarray(xfms[0], dtype=float)
+  for xfm in xfms[1:]:
+    result = np.matmul(result, np.asarray(xfm, dtype=float))
+  return result
+
+# Transforms the (N, 2) array of (x, y) points by xfm, giving an (N, 2) array,
+# or by each of a (..., 3, 3) stack of transforms, giving a (..., N, 2) array.
+def apply(xfm, points):
+  points = np.asarray(points, dtype=float)
+  rows = np.empty(points.shape[:-1] + (3,))
+  rows[..., 0:2] = points
+  rows[..., 2] = 1.
+  return np.matmul(rows, np.asarray(xfm, dtype=float)[..., 0:2])
+
+def _constant(xfm):
+  xfm.setflags(write=False)
+  return xfm
+
+# Common transforms, as read-only arrays.
+IDENTITY_XFORM = _constant(identity_array())
+CLOCKWISE_XFORM = _constant(rotate_array(clockwise=True))
+COUNTERCLOCKWISE_XFORM = _constant(rotate_array(clockwise=False))
+HALF_SCALE_XFORM = _constant(scale_array(0.5, 0.5))